@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 import re
 import argparse
 import pprint
 import subprocess
 import json
-from datasets import load_dataset
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import utils.fol_ast as fol_ast
+from utils.prover import temp_problem_file
 
 GKC_CMD = "gkc"
-TEMP_FILE_NAME = "tmpfile.txt"
+TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
 
 def extract_quantified_variables(logical_expression):
     """
@@ -35,69 +40,49 @@ def extract_quantified_variables(logical_expression):
     }
 
 
-def extract_and_rewrite_quantifiers(logic_statement):
-    """
-    Extracts variables defined by existential and universal quantifiers and rewrites the statement.
-
-    Args:
-        logic_statement (str): The logical expression.
-
-    Returns:
-        dict: A dictionary with existential and universal variables.
-        str: The rewritten logical statement with quantifier wrapping.
-    """
-    # Regular expressions to match quantifiers
-    universal_pattern = r"\u2200(\w+)"  # Matches ∀ (∀) followed by a variable
-    existential_pattern = r"\u2203(\w+)"  # Matches ∃ (∃) followed by a variable
-
-    # Extract variables defined by universal and existential quantifiers
-    universal_vars = re.findall(universal_pattern, logic_statement)
-    existential_vars = re.findall(existential_pattern, logic_statement)
-
-    # Rewrite the logic statement
-    rewritten_statement = re.sub(universal_pattern, r"! [\1] :", logic_statement)
-    rewritten_statement = re.sub(existential_pattern, r"? [\1] :", rewritten_statement)
-
-    return {
-        "u_vars": universal_vars,
-        "e_vars": existential_vars
-    }, rewritten_statement
+# Translation engine used by fol_to_simple_logic: the symbols replaced, with
+# the quantifiers and the variables they bind rewritten in one pass.
+SYMBOLS = {
+    chr(8744): "|",   # ∨ symbol
+    chr(8743): "&",   # ∧ symbol
+    chr(172): "-",    # ¬ symbol
+    chr(8594): "=>",  # → symbol
+    chr(8853): "<~>", # ⊕ symbol
+}
+SYMBOL_RE = re.compile("|".join(re.escape(sym) for sym in SYMBOLS))
+QUANTIFIED_VAR_RE = re.compile(r"[\u2200\u2203](\w+)")
+UNIVERSAL_RE = re.compile(r"\u2200(\w+)")
+EXISTENTIAL_RE = re.compile(r"\u2203(\w+)")
+WORD_SPLIT_RE = re.compile(r"(\w+)")
 
 
-def transform_variables_to_uppercase(logic_statement, variables):
+def translate_clause(clause, upper_vars=[]):
     """
-    Transforms all occurrences of specified variables in the logic statement to uppercase.
+    Convert a single FOL clause to GK simple format.
 
     Args:
-        logic_statement (str): The logical expression.
-        variables (list): List of variable names to transform.
+        clause (str): The FOL clause.
+        upper_vars (list): Additional variables to transform to uppercase.
 
     Returns:
-        str: The logic statement with variables transformed to uppercase.
+        list: The quantified variables and upper_vars
+        str: The converted clause.
     """
-    for var in variables:
-        logic_statement = re.sub(rf"\b{var}\b", var.upper(), logic_statement)
-    return logic_statement
-
+    clause = SYMBOL_RE.sub(lambda m: SYMBOLS[m.group()], clause)
 
-def replace_symbols(el):
-    el = el.replace(chr(8744), "|") # ∨ symbol
-    el = el.replace(chr(8743), "&") # ∧ symbol
-    el = el.replace(chr(172), "-") # ¬ symbol
-    el = el.replace(chr(8594), "=>") # → symbol
-    el = el.replace(chr(8853), "<~>") # ⊕ symbol
-    return el
+    qvars = QUANTIFIED_VAR_RE.findall(clause)
+    if qvars:
+        clause = UNIVERSAL_RE.sub(r"! [\1] :", clause)
+        clause = EXISTENTIAL_RE.sub(r"? [\1] :", clause)
 
-
-def replace_quantifiers(clause, upper_vars=[]):
-
-    vars, new_clause = extract_and_rewrite_quantifiers(clause)
-    varlist = sorted({x for v in vars.values() for x in v})
-    varlist += upper_vars
-    varlist = list(set(varlist))
-    if varlist:
-        new_clause = transform_variables_to_uppercase(new_clause, varlist)
-    return varlist, new_clause
+    varset = set(qvars)
+    varset.update(upper_vars)
+    if varset:
+        # Words and separators alternate in the split, so whole words are
+        # uppercased with a single dictionary lookup each
+        upper = { var: var.upper() for var in varset }
+        clause = "".join([ upper.get(word, word) for word in WORD_SPLIT_RE.split(clause) ])
+    return list(varset), clause
 
 
 def flatten_and_unique(nested_list):
@@ -133,8 +118,7 @@ def fol_to_simple_logic(clauses_str, upper_vars=[]):
     new_clauses = []
     varlist = []
     for cl in clauses:
-        cl_new = replace_symbols(cl)
-        vars, cl_new = replace_quantifiers(cl_new, upper_vars)
+        vars, cl_new = translate_clause(cl, upper_vars)
         if vars:
             varlist.append(vars)
         cl_new += "."
@@ -147,11 +131,22 @@ def fol_to_simple_logic(clauses_str, upper_vars=[]):
 
 
 def logic_to_json(logic):
-    
-    with open("tmpfile.txt", "w") as f:
-        f.write(logic)
+    """
+    Convert simplified logic clauses to JSON-LD-LOGIC without calling GKC.
 
-    result = subprocess.run([GKC_CMD, "-convert", "-json", TEMP_FILE_NAME], capture_output=True, text=True)
+    Args:
+        logic (str): The simplified logic clauses, one '.' terminated clause per line.
+
+    Returns:
+        str: The clauses as a JSON-LD-LOGIC list.
+    """
+    return json.dumps([fol_ast.to_json_ld(f) for f in fol_ast.parse_formulas(logic)])
+
+
+def gkc_logic_to_json(logic):
+    
+    with temp_problem_file(logic, TEMP_DIR) as tmpfile:
+        result = subprocess.run([GKC_CMD, "-convert", "-json", tmpfile], capture_output=True, text=True)
     json_logic = result.stdout
 
     json_logic = eval(json_logic)
@@ -161,56 +156,164 @@ def logic_to_json(logic):
     return json_logic
 
 
-def extract_data(dataset, maxnum, parse_json=False):
-    print("Train:", len(ds_train))
-    print("Validation:", len(ds_valiation))
-    print("---")
+def read_jsonl(path):
+    """
+    Read a FOLIO JSONL file, such as the data/ files used by ttconv.py.
+
+    Returns:
+        list: The examples as dicts.
+    """
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_hf_folio():
+    """
+    Load the FOLIO splits from HuggingFace.
+
+    datasets is imported here, so that local input works without it and
+    without resolving the dataset cache.
+
+    Returns:
+        dict: The 'train' and 'validation' splits.
+    """
+    from datasets import load_dataset
+    ds = load_dataset("tasksource/folio")
+    return { "train": ds["train"], "validation": ds["validation"] }
+
+
+def logic_to_json_list(logic, use_gkc=False):
+    """Convert simplified logic clauses to a JSON-LD-LOGIC list, "Error" if they can not be converted."""
+    try:
+        if use_gkc:
+            return json.loads(gkc_logic_to_json(logic))
+        return json.loads(logic_to_json(logic))
+    except Exception as e:
+        return "Error"
+
+
+def as_text(value):
+    """Join the sentences of a field given as a list, as in the v1 layout."""
+    return "\n".join(value) if isinstance(value, list) else value
+
+
+def convert_example(it, parse_json=False, use_gkc=False):
+    """
+    Convert the premises and the conclusion of a FOLIO example.
+
+    Args:
+        it (dict): The example.
+        parse_json (bool): Also convert the simplified logic to JSON-LD-LOGIC.
+        use_gkc (bool): Use GKC for the JSON-LD-LOGIC conversion.
+
+    Returns:
+        dict: The natural language, FOL, GK and optionally JSON-LD-LOGIC
+        versions of the premises and the conclusion, and the label.
+    """
+    premises_fol = as_text(it["premises-FOL"])
+    varlist, premises_logic = fol_to_simple_logic(premises_fol)
+
+    conclusion_fol = as_text(it["conclusion-FOL"])
+    _, conclusion_logic = fol_to_simple_logic(conclusion_fol, varlist)
+
+    rec = {
+        "premises": as_text(it["premises"]),
+        "premises-FOL": premises_fol,
+        "premises-GK": premises_logic,
+        "conclusion": as_text(it["conclusion"]),
+        "conclusion-FOL": conclusion_fol,
+        "conclusion-GK": conclusion_logic,
+        "label": it.get("label")
+    }
+    if parse_json:
+        rec["premises-JSON"] = logic_to_json_list(premises_logic, use_gkc)
+        rec["conclusion-JSON"] = logic_to_json_list(conclusion_logic, use_gkc)
+    return rec
+
+
+def render_text(rec):
+    """Render a converted example in the text layout of clauses.txt."""
+    res = f"[PREMISE]:\n{rec['premises']}\n\n"
+    res += f"[PREMISE (FOL)]:\n{rec['premises-FOL']}\n\n"
+    res += f"[PREMISE (GK)]:\n{rec['premises-GK']}\n\n"
+    if rec.get("premises-JSON"):
+        res += "[PREMISE (JSON-LD-LOGIC)]:\n"
+        res += pprint.pformat(rec["premises-JSON"], compact=True) + "\n\n"
+    res += f"[CONCLUSION]:\n{rec['conclusion']}\n\n"
+    res += f"[CONCLUSION (FOL)]:\n{rec['conclusion-FOL']}\n\n"
+    res += f"[CONCLUSION (GK)]:\n{rec['conclusion-GK']}\n\n"
+    res += "\n===\n\n"
+    return res
+
+
+def extract_data(dataset, maxnum, parse_json=False, use_gkc=False):
 
     for idx, it in enumerate(dataset):
-        premises_fol = it["premises-FOL"]
-        varlist, premises_logic = fol_to_simple_logic(premises_fol)
-
-        conclusion_fol = it["conclusion-FOL"]
-        _, conclusion_logic = fol_to_simple_logic(conclusion_fol, varlist)
-
-        
-        premises_json = None
-        if parse_json:
-            try:
-                premises_json_str = logic_to_json(premises_logic)
-                premises_json = json.loads(premises_json_str)
-            except Exception as e:
-                premises_json = "Error"
-
-        print(f"[PREMISE]:\n{''.join(it['premises'])}\n")
-        print(f"[PREMISE (FOL)]:\n{premises_fol}\n")
-        print(f"[PREMISE (GK)]:\n{premises_logic}\n")
-        if premises_json:
-            print("[PREMISE (JSON-LD-LOGIC)]:")
-            pprint.pprint(premises_json, compact=True)
-            print()
-        print(f"[CONCLUSION]:\n{''.join(it['conclusion'])}\n")  
-        print(f"[CONCLUSION (FOL)]:\n{it['conclusion-FOL']}\n")
-        print(f"[CONCLUSION (GK)]:\n{conclusion_logic}\n")
-        print("\n===\n")
-        
+        sys.stdout.write(render_text(convert_example(it, parse_json, use_gkc)))
 
         if maxnum > 0 and idx >= maxnum - 1:
             break
 
 
+def bulk_convert(dataset, outfile, maxnum=-1, parse_json=False, use_gkc=False, workers=None, text=False, header=""):
+    """
+    Convert a whole split across a process pool and write the results in order.
+
+    Args:
+        dataset (iterable): The examples.
+        outfile (str): Output file.
+        maxnum (int): Convert at most this many examples, all if not positive.
+        parse_json (bool): Also convert to JSON-LD-LOGIC.
+        use_gkc (bool): Use GKC for the JSON-LD-LOGIC conversion.
+        workers (int): Number of processes, the number of CPUs by default.
+        text (bool): Write the text layout of clauses.txt, starting with header,
+            instead of one JSON object per example.
+
+    Returns:
+        int: The number of converted examples.
+    """
+    examples = list(dataset) if maxnum <= 0 else [it for _, it in zip(range(maxnum), dataset)]
+    convert = partial(convert_example, parse_json=parse_json, use_gkc=use_gkc)
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool, open(outfile, "w") as f:
+        if text:
+            f.write(header)
+        for idx, rec in enumerate(pool.map(convert, examples, chunksize=32)):
+            if text:
+                f.write(render_text(rec))
+            else:
+                f.write(json.dumps({ "id": idx, **rec }, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Prepare FOLIO tests')
+    parser.add_argument("--input", help="Read the examples from a local FOLIO JSONL file instead of HuggingFace")
+    parser.add_argument("--split", choices=["train", "validation"], default="train", help="HuggingFace split to convert")
     parser.add_argument("--max", type=int, default=-1, help="Max number of tests to run")
     parser.add_argument("--json", action="store_true", help="Parse simplified logic to JSON-LD-Logic")
+    parser.add_argument("--gkc-json", action="store_true", help="Use GKC -convert for JSON-LD-Logic instead of the built-in converter")
+    parser.add_argument("--bulk", help="Convert the whole split in parallel and write it to this file")
+    parser.add_argument("--format", choices=["jsonl", "text"], default="jsonl", help="Output format of --bulk, text is the layout of clauses.txt")
+    parser.add_argument("--workers", type=int, help="Number of processes for --bulk, default is the number of CPUs")
 
     args = parser.parse_args()
     maxnum = args.max
-    parse_json = args.json
-
-    ds = load_dataset("tasksource/folio")
-    ds_train = ds["train"]
-    ds_valiation = ds["validation"]
-
-    extract_data(ds_train, maxnum, parse_json)
\ No newline at end of file
+    parse_json = args.json or args.gkc_json
+
+    if args.input:
+        dataset = read_jsonl(args.input)
+        header = f"Input: {args.input} {len(dataset)}\n"
+    else:
+        splits = load_hf_folio()
+        dataset = splits[args.split]
+        header = f"Train: {len(splits['train'])}\nValidation: {len(splits['validation'])}\n"
+    header += "---\n"
+
+    if args.bulk:
+        count = bulk_convert(dataset, args.bulk, maxnum, parse_json, args.gkc_json, args.workers, args.format == "text", header)
+        print("Converted", count, "examples to", args.bulk)
+    else:
+        sys.stdout.write(header)
+        extract_data(dataset, maxnum, parse_json, args.gkc_json)
\ No newline at end of file
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+"""
+Stand-in for the GKC prover, for testing and benchmarking without GKC.
+
+Usage like GKC:    ./fake_gkc.py problem.txt -print 10 -seconds 1
+As a worker:       ./fake_gkc.py --worker   (see utils/prover.py for the protocol)
+
+The answer is derived from a hash of the problem text, so it is deterministic.
+A third of the problems are provable, each needing 0 to 3 seconds of the
+-seconds budget, so longer budgets resolve more of them. Problems that do not parse print an error like GKC does. FAKE_GKC_DELAY sets
+the simulated proof time in seconds (default 0).
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+import utils.fol_ast as fol_ast
+from utils.prover import REQUEST_HEADER, END_MARKER
+
+DELAY = float(os.environ.get("FAKE_GKC_DELAY", "0"))
+
+
+def seconds_flag(flags):
+    if "-seconds" in flags:
+        return float(flags[flags.index("-seconds") + 1])
+    return 1
+
+
+def fake_prove(problemstr, seconds=1):
+    try:
+        fol_ast.parse_formulas(problemstr)
+    except fol_ast.ParseError as e:
+        return f"error: {e}\n"
+    time.sleep(DELAY)
+    h = int(hashlib.sha1(problemstr.encode()).hexdigest(), 16)
+    if h % 3 == 0 and (h // 3) % 4 <= seconds:
+        return "result: proof found\n"
+    return "result: proof not found\n"
+
+
+def serve():
+    lines = None
+    for line in sys.stdin:
+        if line.startswith(REQUEST_HEADER):
+            lines = []
+            seconds = seconds_flag(line.split()[1:])
+        elif line.rstrip("\n") == END_MARKER:
+            sys.stdout.write(fake_prove("".join(lines), seconds))
+            sys.stdout.write(END_MARKER + "\n")
+            sys.stdout.flush()
+        else:
+            lines.append(line)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--worker"]:
+        serve()
+    else:
+        with open(sys.argv[1]) as f:
+            sys.stdout.write(fake_prove(f.read(), seconds_flag(sys.argv[2:])))
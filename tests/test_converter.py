@@ -0,0 +1,15 @@
+from converter import convert_example
+
+V2 = {
+    "premises": "All cats are animals.\nTom is a cat.",
+    "premises-FOL": "∀x (Cat(x) → Animal(x))\nCat(tom)",
+    "conclusion": "Tom is an animal.",
+    "conclusion-FOL": "Animal(tom)",
+    "label": "True",
+}
+
+
+def test_list_fields_convert_like_text():
+    v1 = dict(V2, premises=V2["premises"].split("\n"), **{"premises-FOL": V2["premises-FOL"].split("\n")})
+    assert convert_example(v1) == convert_example(V2)
+    assert convert_example(v1)["premises-GK"].count("\n") == 1
@@ -0,0 +1,42 @@
+import os
+import sys
+import textwrap
+
+from utils.prover import WorkerProver
+
+# A worker answering at once, except for problems containing "slow".
+WORKER = textwrap.dedent("""
+    import sys, time
+    lines = []
+    for line in sys.stdin:
+        if line.startswith("%%PROBLEM"):
+            lines = []
+        elif line.rstrip("\\n") == "%%END":
+            if "slow" in "".join(lines):
+                time.sleep(60)
+            sys.stdout.write("result: proof found\\n%%END\\n")
+            sys.stdout.flush()
+        else:
+            lines.append(line)
+""")
+
+
+def open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def test_race_discards_killed_workers(tmp_path):
+    script = tmp_path / "worker.py"
+    script.write_text(WORKER)
+    prover = WorkerProver([sys.executable, str(script)])
+    jobs = [("slow\n", []), ("fast\n", [])]
+    try:
+        assert prover.race(jobs, lambda i, output: True) == 1
+        workers, fds = len(prover.workers), open_fds()
+        for _ in range(50):
+            assert prover.race(jobs, lambda i, output: True) == 1
+            assert len(prover.workers) == workers
+            assert open_fds() == fds
+    finally:
+        prover.close()
+    assert prover.workers == []
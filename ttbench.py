@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks for the conversion and proving pipeline.
+
+The reference conversions in clauses.txt are used both as the benchmark input
+and as the expected output, so a faster conversion can not silently change the
+converted clauses. The output of ttconv.fol_to_simple_logic for the same
+problems is kept in ttconv_golden.jsonl. The end-to-end benchmark runs process_folio on a synthetic
+corpus built from the same problems and scaled to a multiple of the FOLIO size,
+with fake_gkc.py standing in for GKC.
+
+Usage:
+    ./ttbench.py                      run all benchmarks, compare with the baseline
+    ./ttbench.py --save               store the results as the new baseline
+    ./ttbench.py --scale 100 --jobs 4 larger end-to-end corpus
+    ./ttbench.py --update-golden      store the current ttconv conversion as expected output
+"""
+
+import os
+import sys
+import re
+import json
+import time
+import argparse
+import tempfile
+
+import converter
+import ttconv
+from utils.prover import WorkerProver
+
+REFERENCE_FILE = "clauses.txt"
+GOLDEN_FILE = "ttconv_golden.jsonl"
+BASELINE_FILE = "bench_baseline.json"
+FAKE_GKC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_gkc.py")
+# FOLIO train + validation
+FOLIO_SIZE = 1204
+LABELS = ["True", "False", "Uncertain"]
+SECTION_RE = re.compile(r"^\[([A-Z -]+(?: \([A-Z-]+\))?)\]:\n", re.MULTILINE)
+PREDICATE_RE = re.compile(r"\b([A-Z]\w*)\(")
+
+
+def load_reference(path=REFERENCE_FILE):
+    """
+    Read the problems of clauses.txt.
+
+    Returns:
+        list: One dict per problem with the sections of the problem, e.g.
+        'PREMISE (FOL)' and 'PREMISE (GK)', as strings.
+    """
+    with open(path) as f:
+        text = f.read()
+    records = []
+    for block in text.split("\n===\n"):
+        parts = SECTION_RE.split(block)
+        if len(parts) < 3:
+            continue
+        record = {}
+        for name, body in zip(parts[1::2], parts[2::2]):
+            # Every section is followed by one empty line; the text itself may end in a newline
+            record[name] = body[:-2] if body.endswith("\n\n") else body
+        if "PREMISE (FOL)" in record and "CONCLUSION (FOL)" in record:
+            records.append(record)
+    return records
+
+
+def ttconv_conversion(rec):
+    """
+    Returns:
+        dict: The premises and the conclusion of a problem converted by ttconv.fol_to_simple_logic.
+    """
+    varlist, premises = ttconv.fol_to_simple_logic(rec["PREMISE (FOL)"])
+    _, conclusion = ttconv.fol_to_simple_logic(rec["CONCLUSION (FOL)"], varlist)
+    return { "premises-GK": premises, "conclusion-GK": conclusion }
+
+
+def save_golden(records, path=GOLDEN_FILE):
+    """Store the ttconv conversion of every problem as the expected output, one JSON line each."""
+    with open(path, "w") as f:
+        for rec in records:
+            f.write(json.dumps(ttconv_conversion(rec), ensure_ascii=False) + "\n")
+
+
+def check_reference(records, golden_path=GOLDEN_FILE):
+    """
+    Check the conversions against their expected output.
+
+    converter.fol_to_simple_logic must reproduce the GK sections of clauses.txt
+    exactly. ttconv renames words starting with a number and replaces more
+    symbols for GKC, so ttconv.fol_to_simple_logic is compared with the
+    conversions stored in ttconv_golden.jsonl instead.
+
+    Returns:
+        list: Descriptions of the mismatches, empty if everything matches.
+    """
+    errors = []
+    for idx, rec in enumerate(records):
+        varlist, premises = converter.fol_to_simple_logic(rec["PREMISE (FOL)"])
+        if premises != rec["PREMISE (GK)"]:
+            errors.append(f"problem {idx}: converter premises differ from clauses.txt")
+        _, conclusion = converter.fol_to_simple_logic(rec["CONCLUSION (FOL)"], varlist)
+        if conclusion != rec["CONCLUSION (GK)"]:
+            errors.append(f"problem {idx}: converter conclusion differs from clauses.txt")
+
+    with open(golden_path) as f:
+        golden = [json.loads(line) for line in f]
+    if len(golden) != len(records):
+        errors.append(f"{golden_path} has {len(golden)} problems, the reference {len(records)}")
+    for idx, (rec, expected) in enumerate(zip(records, golden)):
+        converted = ttconv_conversion(rec)
+        for field in ("premises-GK", "conclusion-GK"):
+            if converted[field] != expected[field]:
+                errors.append(f"problem {idx}: ttconv {field} differs from {golden_path}")
+    return errors
+
+
+def timed(func, items, repeat=5, setup=None):
+    """
+    Time func over all items, best of repeat runs. setup is called before each run.
+
+    Returns:
+        float: Microseconds per item.
+    """
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        for it in items:
+            func(it)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best / max(len(items), 1) * 1e6
+
+
+def make_corpus(records, size, path):
+    """
+    Write a synthetic FOLIO JSONL file of size problems built from records.
+
+    Copies after the first get their predicates renamed, so every problem is
+    distinct and no cache can make the copies cheaper than the originals.
+    """
+    with open(path, "w") as f:
+        for idx in range(size):
+            rec = records[idx % len(records)]
+            premises = rec["PREMISE (FOL)"]
+            conclusion = rec["CONCLUSION (FOL)"]
+            copy = idx // len(records)
+            if copy:
+                premises = PREDICATE_RE.sub(rf"\1_c{copy}(", premises)
+                conclusion = PREDICATE_RE.sub(rf"\1_c{copy}(", conclusion)
+            data = {
+                "premises": rec.get("PREMISE", ""),
+                "premises-FOL": premises,
+                "conclusion": rec.get("CONCLUSION", ""),
+                "conclusion-FOL": conclusion,
+                "label": LABELS[idx % len(LABELS)]
+            }
+            f.write(json.dumps(data) + "\n")
+
+
+def clear_memos():
+    """Empty the conversion memos of ttconv, so that conversions are timed cold."""
+    ttconv.convert_clause.cache_clear()
+    ttconv.convert_story_premises.cache_clear()
+
+
+def bench_end_to_end(records, scale, jobs):
+    """
+    Run process_folio on a corpus of scale times the FOLIO size with fake_gkc.py as worker.
+
+    Returns:
+        float: Microseconds per problem.
+    """
+    size = int(FOLIO_SIZE * scale)
+    fd, path = tempfile.mkstemp(prefix="folio_bench_", suffix=".jsonl")
+    os.close(fd)
+    prover = WorkerProver([sys.executable, FAKE_GKC, "--worker"])
+    stdout = sys.stdout
+    try:
+        make_corpus(records, size, path)
+        ttconv.PROVER = prover
+        ttconv.PROOF_CACHE = None
+        ttconv.SAVE_ERROR_FILES = False
+        clear_memos()
+        with open(os.devnull, "w") as devnull:
+            sys.stdout = devnull
+            t0 = time.perf_counter()
+            ttconv.process_folio(ttconv.read_folio(path), jobs=jobs)
+            elapsed = time.perf_counter() - t0
+    finally:
+        sys.stdout = stdout
+        prover.close()
+        os.remove(path)
+    return elapsed / size * 1e6
+
+
+def run_benchmarks(records, scale, jobs):
+    """
+    Returns:
+        dict: Microseconds per item of every benchmark.
+    """
+    premises = [rec["PREMISE (FOL)"] for rec in records]
+    logic = [ttconv.fol_to_simple_logic(p)[1] for p in premises]
+    sentences = [cl for block in logic for cl in block.split("\n")]
+
+    results = {}
+    results["converter.fol_to_simple_logic"] = timed(converter.fol_to_simple_logic, premises)
+    results["ttconv.fol_to_simple_logic"] = timed(ttconv.fol_to_simple_logic, premises, setup=clear_memos)
+    results["ttconv.make_formula_list"] = timed(ttconv.make_formula_list, sentences)
+    results[f"process_folio x{scale:g}"] = bench_end_to_end(records, scale, jobs)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        list: The benchmarks that are slower than baseline by more than tolerance.
+    """
+    slower = []
+    for name, us in results.items():
+        if name in baseline and us > baseline[name] * (1 + tolerance):
+            slower.append(f"{name}: {us:.1f}us, baseline {baseline[name]:.1f}us")
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the FOLIO conversion and proving pipeline')
+    parser.add_argument("--reference", help="Reference conversions", default=REFERENCE_FILE)
+    parser.add_argument("--scale", type=float, default=10, help="End-to-end corpus size as a multiple of FOLIO, e.g. 10 or 100")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of concurrent provers in the end-to-end benchmark")
+    parser.add_argument("--baseline", help="Baseline results to compare with", default=BASELINE_FILE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline, 0.25 is 25%%")
+    parser.add_argument("--save", action="store_true", help="Save the results as the new baseline", default=False)
+    parser.add_argument("--golden", help="Expected ttconv conversions", default=GOLDEN_FILE)
+    parser.add_argument("--update-golden", action="store_true", help="Store the current ttconv conversions as the expected ones and exit", default=False)
+    args = parser.parse_args()
+
+    records = load_reference(args.reference)
+    print("Reference problems:", len(records))
+    if args.update_golden:
+        save_golden(records, args.golden)
+        print("Saved expected conversions to", args.golden)
+        sys.exit(0)
+    errors = check_reference(records, args.golden)
+    for err in errors:
+        print("mismatch:", err)
+    if errors:
+        print("Conversion does not match", args.reference)
+        sys.exit(1)
+
+    results = run_benchmarks(records, args.scale, args.jobs)
+    for name, us in results.items():
+        print("bench:", json.dumps({ "name": name, "us_per_item": round(us, 2) }))
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Saved baseline to", args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for s in slower:
+            print("regression:", s)
+        if slower:
+            sys.exit(1)
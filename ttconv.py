@@ -1,28 +1,85 @@
 #!/usr/bin/env python3
 
+import os
 import sys
 import re
+import shlex
 import argparse
 import pprint
-import subprocess
 import json
+import time
+import asyncio
+import threading
+import io
+import hashlib
+import inspect
+from contextlib import redirect_stdout
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datasets import load_dataset
 import argparse
 
 from utils.logger import Logger
+from utils.proof_cache import ProofCache
+from utils.prover import SubprocessProver, WorkerProver, AsyncSubprocessProver
+import utils.prover as prover_backend
+from utils.profiler import Profiler
+from utils.problem_store import ProblemStore, StoredProblem, StoreError
 import utils.clause_validator as cval
+import utils.fol_ast as fol_ast
+import utils.relevance as relevance
+import utils.signature as signature
+import utils.preflight as preflight
 
 # "folio_v2_validation.jsonl" # "folio_v2_train.jsonl" 
 
 
 GKC_CMD = "gkc"
 GKC_CMD_CONVERT = "gkc06"
-TEMP_FILE_NAME = "tmpfile.txt"
+GKC_FLAGS = ["-print", "10"]
+GKC_SECONDS=1
+# Iterative deepening: problems left unresolved are proved again with the time
+# budget multiplied by DEEPEN_FACTOR, up to MAX_SECONDS. None disables it.
+MAX_SECONDS=None
+DEEPEN_FACTOR=2
+TEMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
 DEBUG_PRINT=False
 CONTINUE_ON_ERROR=True
 SAVE_ERROR_FILES=True
 MAX_NUM = -1
 MIN_QUESTION_ID=-1
+# (i, n): prove only the problems with id % n == i
+SHARD=None
+RACE=False
+USE_AST=False
+CACHE_DIR=".gkc_cache"
+CACHE_MAX_ENTRIES=200000
+PROOF_CACHE=None
+CLAUSE_MEMO_SIZE=65536
+# Backend running GKC for gkc_prove, see utils/prover.py
+PROVER=SubprocessProver([GKC_CMD], TEMP_DIR)
+# Backend of the asyncio driver (--async-jobs), and the wall clock limit of a
+# prover call in seconds, None leaves it to the -seconds flag of GKC
+ASYNC_PROVER=None
+CALL_TIMEOUT=None
+# Strategy portfolio (--portfolio): the strategies in the order they are
+# tried, how many run at the same time (None for all) and the win statistics
+PORTFOLIO=None
+PORTFOLIO_WIDTH=None
+PORTFOLIO_STATS={}
+PORTFOLIO_LOCK=threading.Lock()
+# Premise selection (--relevance): the SInE tolerance, None disables it
+RELEVANCE=None
+RELEVANCE_STATS={ "reduced": 0, "proved_reduced": 0 }
+STATS_LOCK=threading.Lock()
+# Problem ids for which the prover reported an input error
+PROVER_ERRORS=set()
+# Signature check (--signature): answer problems from the symbols of the
+# premises and conclusion without the prover. The reason per problem id that
+# is not proved, by the signature check or by --preflight
+SIGNATURE_CHECK=False
+SKIPPED={}
 
 datafiles = {
   "v1": "folio-validation.jsonl",
@@ -32,112 +89,76 @@ datafiles = {
   "gv": "g-folio-validation.jsonl"
 }
 
-def extract_and_rewrite_quantifiers(logic_statement):
-    """
-    Extracts variables defined by existential and universal quantifiers and rewrites the statement.
-
-    Args:
-        logic_statement (str): The logical expression.
-
-    Returns:
-        dict: A dictionary with existential and universal variables.
-        str: The rewritten logical statement with quantifier wrapping.
-    """
-    # Regular expressions to match quantifiers
-    universal_pattern = r"\u2200(\w+)"  # Matches ∀ (∀) followed by a variable
-    existential_pattern = r"\u2203(\w+)"  # Matches ∃ (∃) followed by a variable
-
-    # Extract variables defined by universal and existential quantifiers
-    universal_vars = re.findall(universal_pattern, logic_statement)
-    existential_vars = re.findall(existential_pattern, logic_statement)
-
-    # Rewrite the logic statement
-    rewritten_statement = re.sub(universal_pattern, r"! [\1] :", logic_statement)
-    rewritten_statement = re.sub(existential_pattern, r"? [\1] :", rewritten_statement)
-
-    return {
-        "u_vars": universal_vars,
-        "e_vars": existential_vars
-    }, rewritten_statement
-
 
+# Precompiled translation engine used by fol_to_simple_logic, the single
+# source of the symbol replacements. ttbench.py checks its output against
+# ttconv_golden.jsonl; run ./ttbench.py --update-golden after changing it.
+SYMBOLS = {
+    chr(8744): "|",   # ∨ symbol
+    chr(8743): "&",   # ∧ symbol
+    chr(172): "-",    # ¬ symbol
+    chr(8594): "=>",  # → symbol
+    chr(8853): "<~>", # ⊕ symbol
+    chr(8660): "<->", # ⇔ symbol
+    chr(8596): "<=>", # ↔ symbol
+    "—>": "=>",
+    chr(8800): "-",   # ≠ symbol
+    "⟷": "<=>",
+    "Ś": "S",
+    "ś": "s",
+    "ą": "a",
+    "è": "e",
+    "’": "_",
+    ".": "_",
+    "'": "_",
+}
+SYMBOL_RE = re.compile("|".join(re.escape(sym) for sym in SYMBOLS))
+DIGIT_RE = re.compile(r"\d")
+NUMBER_WORD_RE = re.compile(r"\b(\d+)(\w*)\b")
+QUANTIFIED_VAR_RE = re.compile(r"[\u2200\u2203](\w+)")
+UNIVERSAL_RE = re.compile(r"\u2200(\w+)")
+EXISTENTIAL_RE = re.compile(r"\u2203(\w+)")
+WORD_SPLIT_RE = re.compile(r"(\w+)")
 
-import re
 
-def replace_words_starting_with_number(input_string):
+def translate_clause(clause, upper_vars=[]):
     """
-    Replace words starting with a number in the input string with a modified format.
-    For example, '2008SummerOlympics' becomes 'num2008_SummerOlympics'.
-    
+    Convert a single FOL clause to GK simple format.
+
     Args:
-    input_string (str): The string to process.
+        clause (str): The FOL clause.
+        upper_vars (list): Additional variables to transform to uppercase.
 
     Returns:
-    str: The modified string.
+        list: The quantified variables and upper_vars
+        str: The converted clause.
     """
-    # Regex to find words starting with numbers
-    pattern = r'\b(\d+)(\w*)\b'
-    
-    # Replacement function to reformat matched words
-    def replacer(match):
-        number = match.group(1)  # Extract the leading number
-        rest = match.group(2)  # Extract the rest of the word
-        return f"n{number}_{rest}"  # Construct the replacement format
+    return translate_quantifiers(translate_symbols(clause), upper_vars)
 
-    # Use re.sub to replace all matches in the string
-    return re.sub(pattern, replacer, input_string)
 
+def translate_symbols(clause):
+    """Replace the logical and special symbols of a clause and rename words starting with a number."""
+    clause = SYMBOL_RE.sub(lambda m: SYMBOLS[m.group()], clause)
+    if DIGIT_RE.search(clause):
+        clause = NUMBER_WORD_RE.sub(r"n\1_\2", clause)
+    return clause
 
 
-def transform_variables_to_uppercase(logic_statement, variables):
-    """
-    Transforms all occurrences of specified variables in the logic statement to uppercase.
+def translate_quantifiers(clause, upper_vars=[]):
+    """Rewrite the quantifiers of a clause and uppercase the quantified variables and upper_vars."""
+    qvars = QUANTIFIED_VAR_RE.findall(clause)
+    if qvars:
+        clause = UNIVERSAL_RE.sub(r"! [\1] :", clause)
+        clause = EXISTENTIAL_RE.sub(r"? [\1] :", clause)
 
-    Args:
-        logic_statement (str): The logical expression.
-        variables (list): List of variable names to transform.
-
-    Returns:
-        str: The logic statement with variables transformed to uppercase.
-    """
-    for var in variables:
-        logic_statement = re.sub(rf"\b{var}\b", var.upper(), logic_statement)
-    return logic_statement
-
-
-def replace_symbols(el):
-    # Logical Symbols
-    el = el.replace(chr(8744), "|") # ∨ symbol
-    el = el.replace(chr(8743), "&") # ∧ symbol
-    el = el.replace(chr(172), "-") # ¬ symbol
-    el = el.replace(chr(8594), "=>") # → symbol
-    el = el.replace(chr(8853), "<~>") # ⊕ symbol
-    el = el.replace(chr(8660), "<->") # ⇔ symbol
-    el = el.replace(chr(8596), "<=>")  # ↔ symbol
-    el = el.replace("—>", "=>")
-    el = el.replace(chr(8800), "-") # ≠ symbol # TODO: Check T2 386, 387  (X=Y) is not correct clause
-    el = el.replace("⟷", "<=>")
-
-    # Spcial characters
-    el = el.replace("Ś", "S") 
-    el = el.replace("ś", "s")
-    el = el.replace("ą", "a")
-    el = el.replace("è", "e")
-    el = el.replace("’", "_")
-    el = el.replace(".", "_")
-    el = el.replace("'", "_")
-    return el
-
-
-def replace_quantifiers(clause, upper_vars=[]):
-
-    vars, new_clause = extract_and_rewrite_quantifiers(clause)
-    varlist = sorted({x for v in vars.values() for x in v})
-    varlist += upper_vars
-    varlist = list(set(varlist))
-    if varlist:
-        new_clause = transform_variables_to_uppercase(new_clause, varlist)
-    return varlist, new_clause
+    varset = set(qvars)
+    varset.update(upper_vars)
+    if varset:
+        # Words and separators alternate in the split, so whole words are
+        # uppercased with a single dictionary lookup each
+        upper = { var: var.upper() for var in varset }
+        clause = "".join([ upper.get(word, word) for word in WORD_SPLIT_RE.split(clause) ])
+    return list(varset), clause
 
 
 def flatten_and_unique(nested_list):
@@ -175,14 +196,9 @@ def fol_to_simple_logic(clauses_str, upper_vars=[]):
     clauses = clauses_str.split("\n")
     new_clauses = []
     varlist = []
+    upper_vars = tuple(upper_vars)
     for cl in clauses:
-        
-        cl = cval.verify_clause_syntax(cl)
-            
-
-        cl_new = replace_symbols(cl)
-        cl_new = replace_words_starting_with_number(cl_new) 
-        vars, cl_new = replace_quantifiers(cl_new, upper_vars)
+        vars, cl_new = convert_clause(cl, upper_vars)
         if vars:
             varlist.append(vars)
         #cl_new += "."
@@ -194,136 +210,564 @@ def fol_to_simple_logic(clauses_str, upper_vars=[]):
     return varlist, ret
 
 
-def logic_to_json(logic):
-    print("Logic", logic)
-    
-    with open("tmpfile.txt", "w") as f:
-        f.write(logic)
+@lru_cache(maxsize=CLAUSE_MEMO_SIZE)
+def convert_clause(clause, upper_vars=()):
+    """
+    Validate and convert a single FOL clause, memoized.
 
-    result = subprocess.run([GKC_CMD_CONVERT, "-convert", "-json", TEMP_FILE_NAME], capture_output=True, text=True)
-    logic = result.stdout
+    Many clauses repeat verbatim across problems and splits, so the results
+    are kept in an LRU cache of CLAUSE_MEMO_SIZE entries, keyed on the clause
+    and the upper_vars context. Warnings of verify_clause_syntax are only
+    given the first time a clause is seen.
 
-    print("Logic", logic)
+    Returns:
+        list: The quantified variables and upper_vars
+        str: The converted clause.
+    """
+    cl = cval.verify_clause_syntax(clause)
+    vars, cl_new = translate_clause(cl, upper_vars)
+    return tuple(vars), cl_new
 
-    logic = "\n".join(logic)
-    logic = json.loads(logic)
-    print(logic)
 
-    return logic
+def memo_summary():
+    """Hit and miss counts of the conversion memos."""
+    res = {}
+    for name, func in [("clauses", convert_clause), ("premises", convert_story_premises)]:
+        info = func.cache_info()
+        res[name] = { "hits": info.hits, "misses": info.misses, "size": info.currsize }
+    return res
 
 
-# ---------- new stuff -----------
+def logic_to_json(logic):
+    """
+    Convert simplified logic clauses to a JSON-LD-LOGIC structure without calling GKC.
 
-def process_folio(lines, only_ids=[]):
+    Args:
+        logic (str): The simplified logic clauses, each terminated by '.'.
 
-  lcount=0
+    Returns:
+        list: The clauses in JSON-LD-LOGIC.
+    """
+    return [fol_ast.to_json_ld(f) for f in fol_ast.parse_formulas(logic)]
 
-  # print("Total lines: ", len(lines))
 
-  for line in lines:
+# ---------- new stuff -----------
 
+def store_path(folio_file):
+  """Path of the problem store built by ttstore.py for a FOLIO JSONL file."""
+  return os.path.splitext(folio_file)[0] + ".gkps"
+
+
+# Part of the conversion fingerprint of problem stores. Bump it when the
+# conversion changes outside the code conversion_fingerprint reads, e.g. in
+# utils/clause_validator.py.
+CONVERSION_VERSION=1
+
+
+def conversion_fingerprint():
+  """
+  Fingerprint of the conversion code, stored in the problem stores built by ttstore.py.
+
+  It covers CONVERSION_VERSION, the SYMBOLS table, the source of the functions
+  that convert a problem and utils/fol_ast.py, so a store built before any of
+  them changed is not used.
+
+  Returns:
+    int: 64 bit fingerprint.
+  """
+  h = hashlib.sha256(f"{CONVERSION_VERSION}\n{sorted(SYMBOLS.items())}\n".encode())
+  for fn in (translate_clause, translate_symbols, translate_quantifiers, fol_to_simple_logic,
+             convert_clause, convert_logic, process_formlist, tokenize_formula, make_formula_list,
+             binary_follow_tokens, build_problems, parse_problem, make_positive_problem,
+             make_negative_problem, fol_ast):
+    try:
+      h.update(inspect.getsource(fn).encode())
+    except OSError:
+      h.update(fn.__code__.co_code)
+  return int.from_bytes(h.digest()[:8], "little")
+
+
+def open_store(folio_file):
+  """
+  Open the problem store of folio_file, if it is usable.
+
+  The store is not used if it is missing, older than the JSONL file, built
+  with a different --ast setting or by a different version of the conversion.
+
+  Returns:
+    ProblemStore: The store, or None.
+  """
+  path = store_path(folio_file)
+  try:
+    store = ProblemStore(path)
+  except (OSError, ValueError, StoreError) as e:
+    print("Problem store not used:", e)
+    return None
+  if not store.is_fresh(folio_file):
+    print("Problem store not used:", path, "is older than", folio_file)
+  elif store.ast != USE_AST:
+    print("Problem store not used:", path, "was built", "with" if store.ast else "without", "--ast")
+  elif store.fingerprint != conversion_fingerprint():
+    print("Problem store not used:", path, "was built by a different version of the conversion, run ttstore.py again")
+  else:
+    return store
+  store.close()
+  return None
+
+
+def parse_shard(text):
+  """
+  Parse a --shard value 'i/n' into (i, n).
+
+  Raises:
+    argparse.ArgumentTypeError: If the value is not of the form i/n with 0 <= i < n.
+  """
+  try:
+    i, n = ( int(x) for x in text.split("/") )
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"expected i/n, got {text!r}")
+  if not 0 <= i < n:
+    raise argparse.ArgumentTypeError(f"shard index must be in 0..{n-1}, got {i}")
+  return i, n
+
+
+def read_folio(path):
+  """Yield the lines of a FOLIO JSONL file one at a time."""
+  with open(path, "r") as f:
+    for line in f:
+      yield line
+
+
+def load_checkpoint(path):
+  """
+  Read the problem ids already completed in a results file.
+
+  A partially written last record, left by a crash, is cut off so that new
+  results can be appended to the file.
+
+  Returns:
+    set: The completed problem ids.
+  """
+  done = set()
+  if not os.path.exists(path):
+    return done
+  good_size = 0
+  with open(path, "rb") as f:
+    for raw in f:
+      # A record without its newline is cut off too, so it is not done
+      if not raw.endswith(b"\n"):
+        break
+      try:
+        done.add(json.loads(raw)["problem_id"])
+      except (ValueError, KeyError):
+        break
+      good_size += len(raw)
+  with open(path, "r+b") as f:
+    f.truncate(good_size)
+  return done
+
+
+def select_problems(lines, only_ids=[], skip_ids=()):
+  """
+  Yield (problem id, line) pairs that pass the --ids/--min/MAX_NUM filters.
+
+  Lines are consumed lazily and only the selected ones are handed on for
+  parsing; reading stops as soon as no further line can be selected.
+  Problems in skip_ids (already completed in a resumed run) and problems of
+  other shards (--shard) are left out.
+  """
+  only_ids = set(only_ids)
+  last_id = max(only_ids) if only_ids else -1
+  if only_ids and isinstance(lines, ProblemStore):
+    # Jump straight to the selected problems
+    store = lines
+    lines = ( store[i] if i in only_ids else None for i in range(min(last_id + 1, len(store))) )
+  for lcount, line in enumerate(lines):
     if len(only_ids) > 0 and lcount not in only_ids:
-      lcount+=1
-      continue  
+      if lcount > last_id: break
+      continue
+
+    if lcount in skip_ids:
+      if MAX_NUM > 0 and lcount + 1 > MAX_NUM: break
+      continue
 
     # TODO: Remove later
     if MIN_QUESTION_ID > 0 and lcount < MIN_QUESTION_ID:
-      lcount+=1
-      print("Skipping")
       continue
 
+    if SHARD is not None and lcount % SHARD[1] != SHARD[0]:
+      if MAX_NUM > 0 and lcount + 1 > MAX_NUM: break
+      continue
 
-    if DEBUG_PRINT: print()
-    print("=== problem",lcount,"===")
-    if DEBUG_PRINT: print("------ problem as text --------")
-    
-    data = json.loads(line)
-    
-    if "premises-FOL" in data:
-      if DEBUG_PRINT: 
-        print("premises-TXT:\n\t",data["premises"])
-        print("Premises-FOL:\n\t",data["premises-FOL"])  
-        
-      premise_lst = data["premises-FOL"]
-      if isinstance(premise_lst, str):
-        [ print("\t", idx, "P:",p, ".") for idx, p in enumerate(premise_lst.split("\n")) ] 
-        premise_lst = premise_lst.split("\n")
+    yield lcount, line
+
+    if MAX_NUM > 0 and lcount + 1 > MAX_NUM: break
+
+
+def solve_problem(lcount, line):
+  """Convert a single FOLIO problem, run the prover and return (gold label, prover label)."""
+  label, posproblem, negproblem = convert_problem(lcount, line)
+  return label, prove_problem(lcount, posproblem, negproblem)
+
+
+def parse_line(line):
+  """Decode one line of a FOLIO JSONL file."""
+  return json.loads(line)
+
+
+def convert_problem(lcount, line):
+  """
+  Convert a single FOLIO problem and return (gold label, positive problem, negative problem).
+
+  line is a line of the FOLIO JSONL file, an already decoded line, or a
+  StoredProblem from a problem store built by ttstore.py, which is already
+  converted.
+  """
+  if isinstance(line, StoredProblem):
+    if SIGNATURE_CHECK:
+      check_signature(lcount, line.premises, line.conclusion)
+    return line.label, line.posproblem, line.negproblem
+
+  data = line if isinstance(line, dict) else parse_line(line)
+  label, premises, conclusion = convert_logic(data)
+  if SIGNATURE_CHECK:
+    check_signature(lcount, premises, conclusion)
+  posproblem, negproblem = build_problems(premises,conclusion)
+  return label, posproblem, negproblem
+
+
+@lru_cache(maxsize=1024)
+def premise_signature(premises):
+  """Signature of the converted premises of a story, None if a premise does not parse."""
+  try:
+    return signature.signature([ fol_ast.parse_formula(p) for p in premises ])
+  except fol_ast.ParseError:
+    return None
+
+
+def signature_reason(premises, conclusion):
+  """
+  Decide from the symbols alone whether a problem needs the prover.
+
+  The problem is Uncertain if the predicates of the conclusion that occur in
+  no premise can make the conclusion both true and false, see
+  utils/signature.py. This is not sound if the premises are inconsistent,
+  as then everything follows; hence SIGNATURE_CHECK is opt-in. Constants
+  of the conclusion that occur in no premise are not used, they are often
+  covered by universal premises. A name used with different arities is an
+  input error of GKC.
+
+  Args:
+    premises (list): Converted premises, as from convert_logic.
+    conclusion (str): Converted conclusion.
+
+  Returns:
+    str: Why the problem is answered without the prover, None if it is not.
+  """
+  sig = premise_signature(tuple(p[0] if isinstance(p, list) else p for p in premises))
+  if sig is None or conclusion is None:
+    return None
+  try:
+    formula = fol_ast.parse_formula(conclusion)
+  except fol_ast.ParseError:
+    return None
+  goal = signature.signature([formula])
+  mismatches = sig.arity_mismatches(goal)
+  if mismatches:
+    return "arity mismatch: " + ", ".join(mismatches)
+  unknown = set(goal.predicates) - set(sig.predicates)
+  if unknown and signature.free_control(formula, unknown) == (True, True):
+    return "unknown predicate: " + ", ".join(sorted(unknown))
+  return None
+
+
+def check_signature(lcount, premises, conclusion):
+  reason = signature_reason(premises, conclusion)
+  if reason is not None:
+    SKIPPED[lcount] = reason
+
+
+def skipped_summary():
+  """Number of skipped problems per kind of reason."""
+  res = {}
+  for reason in SKIPPED.values():
+    kind = reason.split(":")[0]
+    res[kind] = res.get(kind, 0) + 1
+  return res
 
-      premises = process_formlist(premise_lst)
 
-      if DEBUG_PRINT: 
-        print("Premises-Logic:")
-        [ print("\t", idx, "L:",p, ".") for idx, p in enumerate(premises) ] 
-    else:
-      premises=None
+def preflight_folio(lines, only_ids=[], skip_ids=()):
+  """
+  Check the syntax of all selected problems before any of them is proved.
+
+  The problems are converted and checked in-process, see utils/preflight.py.
+  Every bad problem is reported on a preflight: line and recorded in SKIPPED,
+  so the drivers answer it Uncertain without starting the prover, and no
+  error file is written for it.
+
+  Args: see process_folio.
+
+  Returns:
+    int: The number of bad problems.
+  """
+  checked = 0
+  bad = 0
+  for lcount, line in select_problems(lines, only_ids, skip_ids):
+    # The conversion prints the premises, they are printed again when proving
+    with redirect_stdout(io.StringIO()):
+      label, posproblem, negproblem = convert_problem(lcount, line)
+    errors = preflight.problem_errors(posproblem) or preflight.problem_errors(negproblem)
+    checked += 1
+    if errors:
+      bad += 1
+      SKIPPED[lcount] = "preflight: " + "; ".join(errors)
+      print("preflight:", json.dumps({ "problem_id": lcount, "errors": errors }))
+  print("preflight:", json.dumps({ "checked": checked, "bad": bad }))
+  return bad
+
+
+def convert_logic(data):
+  """Convert the premises and conclusion of a decoded FOLIO problem and return (gold label, premises, conclusion)."""
+
+  if DEBUG_PRINT: print("------ problem as text --------")
     
-    if "conclusion-FOL" in data:   
-      if DEBUG_PRINT: 
-        print("conclusion-TXT:\n\t",data["conclusion"])  
-        print("Conclusion-FOL:\n\t",data["conclusion-FOL"])   
-
-      tmp = fol_to_simple_logic(data["conclusion-FOL"])
-      conclusion = tmp[1]
-
-      if DEBUG_PRINT:   
-        print("Conclusion-Logic:\n",conclusion)
-    else:
-      conclusion=None       
+  if "premises-FOL" in data:
+    if DEBUG_PRINT: 
+      print("premises-TXT:\n\t",data["premises"])
+      print("Premises-FOL:\n\t",data["premises-FOL"])  
+        
+    premise_lst = data["premises-FOL"]
+    if isinstance(premise_lst, str):
+      [ print("\t", idx, "P:",p, ".") for idx, p in enumerate(premise_lst.split("\n")) ] 
+      premise_lst = premise_lst.split("\n")
 
-    if "label" in data:
-      label=data["label"]
-    else:
-      label=None  
+    premises = convert_premises(tuple(premise_lst))
 
     if DEBUG_PRINT: 
-      print("------ problem as input logic ------")   
-      print("Premises:")
-      [print("\t",p) for p in premises]
-      print("Conclusion:\n\t",conclusion)
-      print("Label:\n\t",label)
-      print("------ proving ------")
-
-    simpleproblem=make_positive_problem(premises,conclusion)
+      print("Premises-Logic:")
+      [ print("\t", idx, "L:",p, ".") for idx, p in enumerate(premises) ] 
+  else:
+    premises=None
+    
+  if "conclusion-FOL" in data:   
     if DEBUG_PRINT: 
-      print("positive problem in simple format:")
-      [print("\t",p.strip(), ".") for p in simpleproblem.split(".")]
+      print("conclusion-TXT:\n\t",data["conclusion"])  
+      print("Conclusion-FOL:\n\t",data["conclusion-FOL"])   
+
+    tmp = fol_to_simple_logic(data["conclusion-FOL"])
+    conclusion = tmp[1]
+
+    if DEBUG_PRINT:   
+      print("Conclusion-Logic:\n",conclusion)
+  else:
+    conclusion=None       
+
+  if "label" in data:
+    label=data["label"]
+  else:
+    label=None  
+
+  if DEBUG_PRINT: 
+    print("------ problem as input logic ------")   
+    print("Premises:")
+    [print("\t",p) for p in premises]
+    print("Conclusion:\n\t",conclusion)
+    print("Label:\n\t",label)
+    print("------ proving ------")
+
+  return label, premises, conclusion
+
+
+def prove_problem(lcount, posproblem, negproblem, seconds=None):
+  """
+  Run the prover on the positive and, if needed, the negative problem.
+
+  Args:
+    lcount (int): Problem id, used for error reporting.
+    posproblem (str): Premises with the negated conclusion.
+    negproblem (str): Premises with the conclusion.
+    seconds (int): Time budget of each prover call, GKC_SECONDS by default.
+
+  Returns:
+    str: The prover label, "True", "False" or "Uncertain".
+  """
+  if lcount in SKIPPED:
+    return "Uncertain"
+  simpleproblem=posproblem
+  if DEBUG_PRINT: 
+    print("positive problem in simple format:")
+    [print("\t",p.strip(), ".") for p in simpleproblem.split(".")]
     
-    proverres=gkc_prove(simpleproblem, lcount)
+  if RACE:
+    proverres=gkc_race(posproblem, negproblem, lcount, seconds)
+    if DEBUG_PRINT: print("proverres for race:",proverres,"\n")
+  else:
+    proverres=gkc_prove(simpleproblem, lcount, seconds)
 
     if DEBUG_PRINT: print("proverres for positive:",proverres,"\n")       
     
-    if proverres!=True:
-      simpleproblem=make_negative_problem(premises,conclusion)
-      if DEBUG_PRINT: 
-        print("negative problem in simple format:")
-        [print("\t",p.strip(), ".") for p in simpleproblem.split(".")]
-      proverres=gkc_prove(simpleproblem, lcount)
-      if DEBUG_PRINT: print("proverres for negative:",proverres,"\n")
-      if proverres==True:
-        proverres=False
+  if not RACE and proverres!=True:
+    simpleproblem=negproblem
+    if DEBUG_PRINT: 
+      print("negative problem in simple format:")
+      [print("\t",p.strip(), ".") for p in simpleproblem.split(".")]
+    proverres=gkc_prove(simpleproblem, lcount, seconds)
+    if DEBUG_PRINT: print("proverres for negative:",proverres,"\n")
+    if proverres==True:
+      proverres=False
     
-    if DEBUG_PRINT: print("* final result by prover:",proverres)    
-    if DEBUG_PRINT: print("------ check for match with input label ------")
-
-    if proverres==True: 
-      txtres="True"
-    elif proverres==False: 
-      txtres="False"
-    else: txtres="Uncertain"
-    if label==txtres:
-      print("Label corresponds to prover result.")
-    else:
-      print("* Label does not correspond to prover result.") 
-
-    res = {
-      "problem_id": lcount,
-      "gold": label,
-      "prover_res": txtres
-    }       
-    print("ans:", json.dumps(res))   
-
-    lcount+=1
-    if MAX_NUM > 0 and lcount >  MAX_NUM: break
+  if DEBUG_PRINT: print("* final result by prover:",proverres)    
+
+  return result_label(proverres)
+
+
+def result_label(proverres):
+  """Map a prover result, True, False or None, to a FOLIO label."""
+  if proverres==True: 
+    txtres="True"
+  elif proverres==False: 
+    txtres="False"
+  else: txtres="Uncertain"
+  return txtres
+
+
+async def prove_problem_async(lcount, posproblem, negproblem, seconds=None):
+  """
+  asyncio version of prove_problem.
+
+  With RACE the positive and negative problem are proved at the same time and
+  the other prover is cancelled as soon as one of them finds a proof.
+  """
+  if lcount in SKIPPED:
+    return "Uncertain"
+  if not RACE:
+    proverres = await gkc_prove_async(posproblem, lcount, seconds)
+    if proverres != True:
+      proverres = await gkc_prove_async(negproblem, lcount, seconds)
+      proverres = False if proverres == True else None
+    return result_label(proverres)
+
+  tasks = {
+    asyncio.ensure_future(gkc_prove_async(posproblem, lcount, seconds)): True,
+    asyncio.ensure_future(gkc_prove_async(negproblem, lcount, seconds)): False
+  }
+  proverres = None
+  pending = set(tasks)
+  try:
+    while pending and proverres is None:
+      done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+      for task in done:
+        if task.result() == True:
+          proverres = tasks[task]
+          break
+  finally:
+    for task in pending:
+      task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+  return result_label(proverres)
+
+
+async def process_folio_async(lines, only_ids=[], jobs=16, results=None, skip_ids=()):
+  """
+  asyncio driver for process_folio.
+
+  GKC is run with asyncio subprocesses by ASYNC_PROVER, which keeps at most
+  jobs provers running, so a single thread keeps many provers busy. Problems
+  are reported in problem id order. If the run is interrupted, the problems
+  in flight are cancelled and their prover processes killed.
+
+  Args: see process_folio.
+  """
+  async def solve(lcount, line):
+    label, posproblem, negproblem = convert_problem(lcount, line)
+    return label, await prove_problem_async(lcount, posproblem, negproblem)
+
+  pending = deque()
+  try:
+    for lcount, line in select_problems(lines, only_ids, skip_ids):
+      pending.append((lcount, asyncio.ensure_future(solve(lcount, line))))
+      if len(pending) >= 2 * jobs:
+        await report_next_async(pending, results)
+    while pending:
+      await report_next_async(pending, results)
+  finally:
+    for _, task in pending:
+      task.cancel()
+    await asyncio.gather(*(task for _, task in pending), return_exceptions=True)
+
+
+async def report_next_async(pending, results):
+  lcount, task = pending[0]
+  label, txtres = await task
+  pending.popleft()
+  if DEBUG_PRINT: print()
+  print("=== problem",lcount,"===")
+  report_result(lcount, label, txtres, results)
+
+
+def report_result(lcount, label, txtres, results=None, seconds=None):
+  """
+  Print the ans: line of a problem and append it to the results file, if one is given.
+
+  With iterative deepening, seconds is the time budget the label was reached with.
+  """
+  if DEBUG_PRINT: print("------ check for match with input label ------")
+  if label==txtres:
+    print("Label corresponds to prover result.")
+  else:
+    print("* Label does not correspond to prover result.") 
+
+  res = {
+    "problem_id": lcount,
+    "gold": label,
+    "prover_res": txtres
+  }       
+  if seconds is not None:
+    res["seconds"] = seconds
+  if lcount in SKIPPED:
+    # Answered by the signature check, not by the prover
+    res["skipped"] = SKIPPED[lcount]
+  print("ans:", json.dumps(res))   
+  if results is not None:
+    # The results file is the checkpoint of --resume
+    results.write(json.dumps(res) + "\n")
+    results.flush()
+    os.fsync(results.fileno())
+
+
+def process_folio(lines, only_ids=[], jobs=1, results=None, skip_ids=()):
+  """
+  Prove the selected FOLIO problems and report them in problem id order.
+
+  Args:
+    lines (iterable): Lines of the FOLIO JSONL file, e.g. from read_folio.
+    only_ids (list): Prove only these problem ids.
+    jobs (int): Number of problems proved concurrently.
+    results (file): Optional file the results are written to as JSONL.
+    skip_ids (set): Problem ids that are already completed.
+  """
+
+  problems = select_problems(lines, only_ids, skip_ids)
+
+  if jobs <= 1:
+    for lcount, line in problems:
+      if DEBUG_PRINT: print()
+      print("=== problem",lcount,"===")
+      label, txtres = solve_problem(lcount, line)
+      report_result(lcount, label, txtres, results)
+    return
+
+  # Provers run concurrently, but results are reported in problem id order
+  # so the ans: lines are identical to a sequential run. Only a bounded
+  # window of problems is in flight, so memory stays flat on large inputs.
+  with ThreadPoolExecutor(max_workers=jobs) as pool:
+    pending = deque()
+    for lcount, line in problems:
+      pending.append((lcount, pool.submit(solve_problem, lcount, line)))
+      if len(pending) >= 2 * jobs:
+        report_next(pending, results)
+    while pending:
+      report_next(pending, results)
  
   return
 
@@ -334,6 +778,198 @@ def process_folio(lines, only_ids=[]):
   for sentence in res2:
     print(sentence)
 
+def deepen_budgets():
+  """Time budgets of the iterative deepening rounds, from GKC_SECONDS up to MAX_SECONDS."""
+  budgets = [GKC_SECONDS]
+  while MAX_SECONDS and budgets[-1] < MAX_SECONDS:
+    budget = min(budgets[-1] * DEEPEN_FACTOR, MAX_SECONDS)
+    if budget <= budgets[-1]:
+      break
+    budgets.append(budget)
+  return budgets
+
+
+def deepen_folio(lines, only_ids=[], jobs=1, results=None, skip_ids=()):
+  """
+  Prove the selected FOLIO problems with growing time budgets.
+
+  All problems are first proved with the shortest budget. Only those left
+  Uncertain are queued again for the next budget, up to MAX_SECONDS, so the
+  time goes to the problems that need it. A problem is reported as soon as its
+  label is final, with the budget that settled it; the ans: lines are in
+  problem id order within each round. Problems with input errors are not
+  proved again.
+
+  The first round streams the input through a bounded window like
+  process_folio; only the converted problems left unresolved are kept for
+  the later rounds.
+
+  Args: see process_folio.
+  """
+  budgets = deepen_budgets()
+
+  def first_round(lcount, line):
+    problem = (lcount,) + convert_problem(lcount, line)
+    return problem, prove_problem(lcount, problem[2], problem[3], budgets[0])
+
+  def next_round(problem, seconds):
+    return problem, prove_problem(problem[0], problem[2], problem[3], seconds)
+
+  unresolved = []
+  with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+    for seconds in budgets:
+      if seconds == budgets[0]:
+        tasks = ( (first_round, lcount, line) for lcount, line in select_problems(lines, only_ids, skip_ids) )
+      else:
+        tasks = ( (next_round, problem, seconds) for problem in unresolved )
+      proved = 0
+      queue = []
+      pending = deque()
+      for task in tasks:
+        pending.append(pool.submit(*task))
+        proved += 1
+        if len(pending) >= 2 * max(jobs, 1):
+          deepen_settle(pending.popleft().result(), seconds, budgets, queue, results)
+      while pending:
+        deepen_settle(pending.popleft().result(), seconds, budgets, queue, results)
+      print("deepen:", json.dumps({ "seconds": seconds, "proved": proved, "unresolved": len(queue) }))
+      unresolved = queue
+
+
+def deepen_settle(done, seconds, budgets, unresolved, results):
+  """Report a problem of a deepening round, or append it to unresolved for the next round."""
+  problem, txtres = done
+  lcount, label = problem[:2]
+  if txtres == "Uncertain" and seconds < budgets[-1] and lcount not in PROVER_ERRORS and lcount not in SKIPPED:
+    unresolved.append(problem)
+    return
+  if DEBUG_PRINT: print()
+  print("=== problem",lcount,"===")
+  report_result(lcount, label, txtres, results, seconds)
+
+
+def story_key(line):
+  """Key identifying the story of a problem: its premises."""
+  if isinstance(line, StoredProblem):
+    return tuple(line.premises)
+  premises = line.get("premises-FOL")
+  return tuple(premises) if isinstance(premises, list) else premises
+
+
+def select_stories(problems):
+  """
+  Group selected (problem id, line) pairs into stories.
+
+  Consecutive problems with the same premises form a story, as FOLIO lists
+  the conclusions of a story one after the other. JSONL lines are decoded here.
+
+  Yields:
+    list: The (problem id, line) pairs of one story.
+  """
+  story = []
+  key = None
+  for lcount, line in problems:
+    if not isinstance(line, StoredProblem):
+      line = parse_line(line)
+    if story and story_key(line) != key:
+      yield story
+      story = []
+    key = story_key(line)
+    story.append((lcount, line))
+  if story:
+    yield story
+
+
+def solve_story(story):
+  """
+  Convert and prove the problems of a story.
+
+  The positive problems of the story go to the prover in one prove_many
+  call, followed by the negative problems that are still open, so a worker
+  backend (--worker) gets the whole story as one batch.
+
+  Returns:
+    list: (problem id, gold label, prover label) of every problem.
+  """
+  converted = [ (lcount,) + convert_problem(lcount, line) for lcount, line in story ]
+  ids = [ c[0] for c in converted ]
+  prove_idx = [ i for i, lcount in enumerate(ids) if lcount not in SKIPPED ]
+  posres = [None] * len(converted)
+  for i, res in zip(prove_idx, gkc_prove_many([ converted[i][2] for i in prove_idx ], [ ids[i] for i in prove_idx ])):
+    posres[i] = res
+  open_idx = [ i for i in prove_idx if posres[i] != True ]
+  negres = gkc_prove_many([ converted[i][3] for i in open_idx ], [ ids[i] for i in open_idx ])
+  labels = [ "True" if res == True else "Uncertain" for res in posres ]
+  for i, res in zip(open_idx, negres):
+    if res == True:
+      labels[i] = "False"
+  return [ (c[0], c[1], txtres) for c, txtres in zip(converted, labels) ]
+
+
+def process_stories(lines, only_ids=[], jobs=1, results=None, skip_ids=()):
+  """
+  Prove the selected FOLIO problems story by story, see solve_story.
+
+  The problems are reported in problem id order, like process_folio.
+
+  Args: see process_folio.
+  """
+  stories = select_stories(select_problems(lines, only_ids, skip_ids))
+  if jobs <= 1:
+    for story in stories:
+      report_story(solve_story(story), results)
+    return
+
+  with ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+    pending = deque()
+    for story in stories:
+      pending.append(pool.submit(solve_story, story))
+      if len(pending) >= 2 * jobs:
+        report_story(pending.popleft().result(), results)
+    while pending:
+      report_story(pending.popleft().result(), results)
+
+
+def report_story(solved, results):
+  for lcount, label, txtres in solved:
+    if DEBUG_PRINT: print()
+    print("=== problem",lcount,"===")
+    report_result(lcount, label, txtres, results)
+
+
+def report_next(pending, results):
+  lcount, fut = pending.popleft()
+  if DEBUG_PRINT: print()
+  print("=== problem",lcount,"===")
+  label, txtres = fut.result()
+  report_result(lcount, label, txtres, results)
+
+
+def parse_problem(premises,conclusion):
+  """Parse converted premises and conclusion into formula trees, None if any of them does not parse."""
+  try:
+    trees = [ fol_ast.parse_formula(p[0] if isinstance(p, list) else p) for p in premises ]
+    return trees, fol_ast.parse_formula(conclusion)
+  except fol_ast.ParseError:
+    return None
+
+
+def build_problems(premises,conclusion):
+  """
+  Build the positive and negative problem text for the prover.
+
+  With USE_AST the problems are emitted from parsed formula trees; if a formula
+  does not parse, the problems are concatenated from the strings as before so
+  GKC still reports the error.
+  """
+  if USE_AST:
+    parsed = parse_problem(premises,conclusion)
+    if parsed is not None:
+      return (fol_ast.problem_to_gk(fol_ast.positive_problem(*parsed)),
+              fol_ast.problem_to_gk(fol_ast.negative_problem(*parsed)))
+  return make_positive_problem(premises,conclusion), make_negative_problem(premises,conclusion)
+
+
 def make_positive_problem(premises,conclusion):
   for idx, p in enumerate(premises):
     if isinstance(p, list):
@@ -355,6 +991,25 @@ def make_negative_problem(premises,conclusion):
   return res
 
       
+@lru_cache(maxsize=1024)
+def convert_story_premises(premise_lst):
+  return process_formlist(premise_lst)
+
+
+def convert_premises(premise_lst):
+  """
+  Convert the premises of a problem, memoized per story.
+
+  FOLIO stories share their premises between several conclusions, so the
+  premises are converted once per story. The result is copied because
+  make_positive_problem rewrites the list in place.
+
+  Args:
+    premise_lst (tuple): The FOL premises.
+  """
+  return list(convert_story_premises(premise_lst))
+
+
 def process_formlist(lst, debug=False):
   res = []
   for idx, frm in enumerate(lst):
@@ -376,33 +1031,37 @@ def process_formlist(lst, debug=False):
 
 
 
-def make_formula_list(frm, debug=False):
-  i=0
-  res=""
+# Parentheses, runs of blanks and runs of any other text
+FORMULA_TOKEN_RE = re.compile(r"[()]|[ \t]+|[^() \t]+")
+
+
+def tokenize_formula(frm):
+  """Split a formula into a token list, see FORMULA_TOKEN_RE. Joining the tokens gives back frm."""
+  return FORMULA_TOKEN_RE.findall(frm)
+
+
+def make_formula_list(frm, debug=False, tokens=None):
+  """
+  Split a formula string into top level sentences, each terminated with a '.'.
+
+  A sentence ends at a closing parenthesis that balances the parentheses,
+  unless it is followed by a binary connective. Pass tokens to reuse a token
+  list from tokenize_formula.
+  """
+  if tokens is None:
+    tokens=tokenize_formula(frm)
   par=0
   sentences=[]
-  sentence=""
-  while(i<len(frm)):
-    c=frm[i]
-    if c=="(":
+  sentence=[]
+  for i, tok in enumerate(tokens):
+    sentence.append(tok)
+    if tok=="(":
       par+=1
-      sentence+=c
-    elif c==")":
+    elif tok==")":
       par-=1
-      sentence+=c
-      if par==0 and not binary_follow(frm,i+1):
-        sentence=sentence.strip()
-        sentence+="."
-        sentences.append(sentence)
-        sentence=""
-      # elif par == 1 and not binary_follow(frm,i+1):
-      #   sentence=sentence.strip()
-      #   sentence += ")."
-      #   sentences.append(sentence)
-      #  sentence = ""
-    else:
-      sentence+=c
-    i+=1 
+      if par==0 and not binary_follow_tokens(tokens,i+1):
+        sentences.append("".join(sentence).strip()+".")
+        sentence=[]
 
   if debug:
     print("Frm:", frm)
@@ -410,33 +1069,327 @@ def make_formula_list(frm, debug=False):
     
   return sentences       
 
-    
-def binary_follow(s,i):
-  while(i<len(s)):
-    c=s[i]
-    if c in ["&","V","v","<"]:
-      return True
-    elif c in [" ","\t"]:
-      pass
-    else:
-      return False
+
+def binary_follow_tokens(tokens,i):
+  """Whether a binary connective follows position i of the token list, after at most one blank."""
+  if i<len(tokens) and tokens[i][0] in " \t":
     i+=1
-  return False  
+  return i<len(tokens) and tokens[i][0] in "&Vv<"
+
+    
+def install_profiler():
+  """
+  Time the stages of the run, see utils/profiler.py.
+
+  The stages are parse (JSON decoding), validate, symbols and quantifiers
+  (clause translation), split (sentence split), build (problem text), temp_file
+  and prover (GKC startup and proving), cache_get/cache_put, and the per-problem
+  totals convert and prove. With --race the prover calls are also timed as race,
+  with --async-jobs the asyncio prover calls and problems count as prover and prove.
+  prover_startup is the time GKC takes on a trivial problem, an estimate of
+  the startup cost included in every prover call.
+
+  Returns:
+    Profiler: The installed profiler.
+  """
+  profiler = Profiler()
+  startup = []
+  for _ in range(3):
+    t0 = time.perf_counter()
+    PROVER.prove("p.\n", gkc_flags())
+    startup.append(time.perf_counter() - t0)
+  profiler.info["prover_startup"] = round(min(startup), 6)
+
+  module = sys.modules[__name__]
+  stages = [("parse_line", "parse"), ("translate_symbols", "symbols"), ("translate_quantifiers", "quantifiers"),
+            ("make_formula_list", "split"), ("build_problems", "build"), ("convert_problem", "convert"),
+            ("prove_problem", "prove"), ("gkc_race", "race")]
+  for attr, stage in stages:
+    profiler.instrument(module, attr, stage)
+  profiler.instrument(cval, "verify_clause_syntax", "validate")
+  profiler.instrument(prover_backend, "write_problem", "temp_file")
+  # One stage per prover call: SubprocessProver proves through run, and
+  # WorkerProver through prove_many, which also times the --stories batches.
+  if isinstance(PROVER, SubprocessProver):
+    profiler.instrument(PROVER, "run", "prover")
+  else:
+    profiler.instrument(PROVER, "prove_many", "prover")
+  profiler.instrument(PROVER, "race", "prover")
+  if ASYNC_PROVER is not None:
+    profiler.instrument(ASYNC_PROVER, "prove", "prover")
+    profiler.instrument(module, "prove_problem_async", "prove")
+  if PROOF_CACHE is not None:
+    profiler.instrument(PROOF_CACHE, "get", "cache_get")
+    profiler.instrument(PROOF_CACHE, "put", "cache_put")
+  return profiler
+
+
+def gkc_flags(seconds=None):
+    return GKC_FLAGS + ["-seconds", str(seconds or GKC_SECONDS)]
+
+
+def cache_key(problemstr, command=None, seconds=None):
+    if PROOF_CACHE is None:
+      return None
+    return PROOF_CACHE.key(problemstr, (command or PROVER.command) + gkc_flags(seconds))
+
 
+def cache_store(key, resulttxt, proverres):
+    # Errors are not cached so that they are reported again on the next run
+    if key is not None and ("proof found" in resulttxt or "proof not found" in resulttxt):
+      PROOF_CACHE.put(key, proverres)
 
 
-def gkc_prove(problemstr, question_id):
+def relevant_problem(problemstr):
+    """
+    Reduce a problem to the premises relevant to its goal, see utils/relevance.py.
+
+    The goal is the last sentence of the problem, the (negated) conclusion.
+
+    Returns:
+        str: The reduced problem, None if the problem does not parse or no premise is left out.
+    """
+    try:
+      formulas = fol_ast.parse_formulas(problemstr)
+    except fol_ast.ParseError:
+      return None
+    if len(formulas) < 2:
+      return None
+    premises, goal = formulas[:-1], formulas[-1]
+    selected = relevance.select_premises(premises, goal, RELEVANCE)
+    if len(selected) == len(premises):
+      return None
+    return fol_ast.problem_to_gk([ premises[i] for i in selected ] + [goal])
+
+
+def gkc_prove(problemstr, question_id, seconds=None):
+    """
+    Run the prover on a problem and return True if a proof was found, None otherwise.
+
+    With RELEVANCE the problem is first proved with only the premises relevant
+    to the goal. A proof of the reduced problem is also a proof of the full
+    problem; if there is none, the full problem is proved.
+    """
+    if RELEVANCE is not None:
+      reduced = relevant_problem(problemstr)
+      if reduced is not None:
+        proverres = gkc_prove_full(reduced, question_id, seconds)
+        with STATS_LOCK:
+          RELEVANCE_STATS["reduced"] += 1
+          if proverres == True:
+            RELEVANCE_STATS["proved_reduced"] += 1
+        if proverres == True:
+          return proverres
+    return gkc_prove_full(problemstr, question_id, seconds)
+
+
+def gkc_prove_full(problemstr, question_id, seconds=None):
     #print("problemstr", problemstr)    
-    with open("tmpfile.txt", "w") as f:
-        f.write(problemstr)
-    result = subprocess.run([GKC_CMD, TEMP_FILE_NAME, "-print", "10", "-seconds", "1"], capture_output=True, text=True)
-    resulttxt = result.stdout
+    if PORTFOLIO:
+      return gkc_portfolio(problemstr, question_id, seconds)
+    key = cache_key(problemstr, seconds=seconds)
+    if key is not None:
+      hit, proverres = PROOF_CACHE.get(key)
+      if hit:
+        return proverres
+
+    resulttxt = PROVER.prove(problemstr, gkc_flags(seconds))
+    proverres = gkc_result(resulttxt, problemstr, question_id)
+    cache_store(key, resulttxt, proverres)
+    return proverres
+
+
+def gkc_prove_many(problemstrs, question_ids, seconds=None):
+    """
+    Batch version of gkc_prove.
+
+    The problems that are not in the cache are handed to the prover backend
+    in a single prove_many call.
+
+    Returns:
+        list: The results of gkc_result, in the order of problemstrs.
+    """
+    proverres = [None] * len(problemstrs)
+    keys = [ cache_key(p, seconds=seconds) for p in problemstrs ]
+    todo = []
+    for i, key in enumerate(keys):
+      if key is not None:
+        hit, res = PROOF_CACHE.get(key)
+        if hit:
+          proverres[i] = res
+          continue
+      todo.append(i)
+    if todo:
+      outputs = PROVER.prove_many([ problemstrs[i] for i in todo ], gkc_flags(seconds))
+      for i, resulttxt in zip(todo, outputs):
+        proverres[i] = gkc_result(resulttxt, problemstrs[i], question_ids[i])
+        cache_store(keys[i], resulttxt, proverres[i])
+    return proverres
+
+
+async def gkc_prove_async(problemstr, question_id, seconds=None):
+    """asyncio version of gkc_prove, using ASYNC_PROVER. A prover call that times out counts as no proof."""
+    key = cache_key(problemstr, ASYNC_PROVER.command, seconds)
+    if key is not None:
+      hit, proverres = PROOF_CACHE.get(key)
+      if hit:
+        return proverres
+
+    try:
+      resulttxt = await ASYNC_PROVER.prove(problemstr, gkc_flags(seconds))
+    except asyncio.TimeoutError:
+      print("Prover timed out on question:", question_id)
+      return None
+    proverres = gkc_result(resulttxt, problemstr, question_id)
+    cache_store(key, resulttxt, proverres)
+    return proverres
+
+
+def gkc_race(posproblem, negproblem, question_id, seconds=None):
+    """
+    Run GKC on the positive and the negative problem at the same time, with PROVER.race.
+
+    As soon as one of the provers finds a proof the other one is killed.
+    If the premises are inconsistent both problems are provable and the
+    answer is whichever prover finishes first.
+
+    Args:
+        posproblem (str): Premises with the negated conclusion.
+        negproblem (str): Premises with the conclusion.
+        question_id (int): Problem id, used for error reporting.
+        seconds (int): Time budget of each prover, GKC_SECONDS by default.
+
+    Returns:
+        True if the positive problem was proved, False if the negative one was, None otherwise.
+    """
+    problems = { True: posproblem, False: negproblem }
+    keys = { answer: cache_key(problem, seconds=seconds) for answer, problem in problems.items() }
+    if PROOF_CACHE is not None:
+      cached = { answer: PROOF_CACHE.get(key) for answer, key in keys.items() }
+      for answer in (True, False):
+        if cached[answer] == (True, True):
+          return answer
+      if cached[True][0] and cached[False][0]:
+        return None
+
+    answers = [True, False]
+    def stop(i, resulttxt):
+      res = gkc_result(resulttxt, problems[answers[i]], question_id)
+      cache_store(keys[answers[i]], resulttxt, res)
+      return res == True
+
+    winner = PROVER.race([ (problems[answer], gkc_flags(seconds)) for answer in answers ], stop)
+    return None if winner is None else answers[winner]
+
+
+def portfolio_stats_file(path):
+    return os.path.splitext(path)[0] + "_stats.json"
+
+
+def load_portfolio(path):
+    """
+    Read a strategy portfolio and its win statistics.
+
+    The portfolio is a JSON list of strategies like
+    {"name": "default", "flags": ["-print", "10"]}. The strategies are ordered
+    by the number of problems they won in earlier runs, most wins first.
+
+    Returns:
+        list: The strategies in the order they are tried.
+        dict: Wins and runs per strategy name.
+    """
+    with open(path, "r") as f:
+        strategies = json.load(f)
+    stats = {}
+    if os.path.exists(portfolio_stats_file(path)):
+      with open(portfolio_stats_file(path), "r") as f:
+        stats = json.load(f)
+    strategies.sort(key=lambda st: -stats.get(st["name"], {}).get("wins", 0))
+    return strategies, stats
+
+
+def save_portfolio_stats(path):
+    with PORTFOLIO_LOCK:
+      with open(portfolio_stats_file(path), "w") as f:
+        json.dump(PORTFOLIO_STATS, f, indent=2)
+
+
+def strategy_flags(strategy, seconds=None):
+    """Flags of a strategy, with the time limit added unless the strategy sets one."""
+    flags = list(strategy["flags"])
+    if "-seconds" not in flags:
+      flags += ["-seconds", str(seconds or GKC_SECONDS)]
+    return flags
+
+
+def count_portfolio(strategies, winner):
+    with PORTFOLIO_LOCK:
+      for st in strategies:
+        entry = PORTFOLIO_STATS.setdefault(st["name"], { "wins": 0, "runs": 0 })
+        entry["runs"] += 1
+        if st is winner:
+          entry["wins"] += 1
+
+
+def gkc_portfolio(problemstr, question_id, seconds=None):
+    """
+    Run the strategies of PORTFOLIO on a problem at the same time.
+
+    The strategies are run with PROVER.race: the first strategy that finds
+    a proof wins and the others are killed.
+    With PORTFOLIO_WIDTH only that many strategies run at once, in portfolio
+    order, and the next group is started if none of them finds a proof.
+    Wins are counted per strategy in PORTFOLIO_STATS.
+
+    Returns:
+        True if a strategy found a proof, None otherwise.
+    """
+    flags = { st["name"]: strategy_flags(st, seconds) for st in PORTFOLIO }
+    key = None
+    if PROOF_CACHE is not None:
+      key = PROOF_CACHE.key(problemstr, PROVER.command + ["portfolio"] + [ " ".join(f) for f in flags.values() ])
+      hit, proverres = PROOF_CACHE.get(key)
+      if hit:
+        return proverres
+
+    width = PORTFOLIO_WIDTH or len(PORTFOLIO)
+    proverres = None
+    complete = True
+    def stop(i, resulttxt):
+      nonlocal complete
+      res = gkc_result(resulttxt, problemstr, question_id)
+      if res != True and "proof not found" not in resulttxt:
+        complete = False
+      return res == True
+
+    for start in range(0, len(PORTFOLIO), width):
+      group = PORTFOLIO[start:start + width]
+      winner = PROVER.race([ (problemstr, flags[st["name"]]) for st in group ], stop)
+      count_portfolio(group, None if winner is None else group[winner])
+      if winner is not None:
+        proverres = True
+        break
+      if question_id in PROVER_ERRORS:
+        break
+    # A problem is only cached as unprovable if every strategy gave up on it
+    if key is not None and (proverres == True or complete):
+      PROOF_CACHE.put(key, proverres)
+    return proverres
+
+
+def gkc_result(resulttxt, problemstr, question_id):
     #print("resulttxt", resulttxt)
     if "proof not found" in resulttxt:
       return None
     elif "proof found" in resulttxt:
       return True
     elif "error" in resulttxt:
+      # Reported once per problem, not once per prover call on it
+      with STATS_LOCK:
+        reported = question_id in PROVER_ERRORS
+        PROVER_ERRORS.add(question_id)
+      if reported:
+        return None
       print("Prover found an error in input:",resulttxt)
       print("full prover input text where the error was found:\n",problemstr)
       
@@ -480,24 +1433,125 @@ if __name__ == "__main__":
     parser.add_argument("--debug", action="store_true", help="Print debug info", default=False)
     parser.add_argument("--ids", help="Parse only ids")
     parser.add_argument("--min", help="Minimal question ID")
+    parser.add_argument("--race", action="store_true", help="Prove the positive and negative problem at the same time", default=False)
+    parser.add_argument("--no-cache", action="store_true", help="Always run the prover, ignoring cached results", default=False)
+    parser.add_argument("--cache-dir", help="Directory of the prover result cache", default=CACHE_DIR)
+    parser.add_argument("--ast", action="store_true", help="Build prover problems from parsed formula trees", default=False)
+    parser.add_argument("--results", help="Write the results to this JSONL file as they complete")
+    parser.add_argument("--resume", action="store_true", help="Skip problems already in the results file (default results_<df>.jsonl) and append to it", default=False)
+    parser.add_argument("--gkc", help="GKC executable, e.g. ./fake_gkc.py for testing", default=GKC_CMD)
+    parser.add_argument("--worker", help="Prove with long-lived worker processes started by this command, e.g. './fake_gkc.py --worker'")
+    parser.add_argument("--seconds", type=int, default=GKC_SECONDS, help="Prover time limit per problem")
+    parser.add_argument("--max-seconds", type=int, help="Prove unresolved problems again with doubled time limits up to this many seconds")
+    parser.add_argument("--profile", nargs="?", const="", help="Print a profile: line with the time spent per stage at the end, and write it to this JSON file if given")
+    parser.add_argument("--store", action="store_true", help="Read the converted problems from the problem store built by ttstore.py", default=False)
+    parser.add_argument("--stories", action="store_true", help="Prove the problems of a story together, as one batch for the prover backend", default=False)
+    parser.add_argument("--async-jobs", type=int, help="Run up to this many provers concurrently from a single asyncio event loop")
+    parser.add_argument("--call-timeout", type=float, help="Kill a prover call of --async-jobs after this many seconds")
+    parser.add_argument("--shard", type=parse_shard, help="Prove only shard i of n, the problems with id %% n == i, e.g. 0/4")
+    parser.add_argument("--portfolio", help="JSON file of GKC strategies to run on every problem at the same time, the first proof wins")
+    parser.add_argument("--portfolio-width", type=int, help="Run at most this many strategies of the portfolio at the same time")
+    parser.add_argument("--relevance", type=float, nargs="?", const=1.0, help="Prove with only the premises relevant to the conclusion first (SInE premise selection with this tolerance, default 1.0)")
+    parser.add_argument("--signature", action="store_true", help="Answer Uncertain without the prover if predicates no premise has decide the conclusion, and skip arity mismatches (unsound for inconsistent premises)", default=False)
+    parser.add_argument("--preflight", action="store_true", help="Check the syntax of all problems before proving and do not prove the bad ones", default=False)
+    parser.add_argument("--jobs", type=int, default=1, help="Number of concurrent prover processes")
     
     args = parser.parse_args()
+    # Options that a driver would ignore, so the run would differ from the one asked for
+    unsupported = {
+      "--async-jobs": ["--worker", "--stories", "--max-seconds", "--portfolio", "--relevance"],
+      "--stories": ["--race", "--max-seconds", "--portfolio", "--relevance", "--shard"],
+      "--race": ["--portfolio", "--relevance"]
+    }
+    given = lambda opt: getattr(args, opt[2:].replace("-", "_")) not in (None, False)
+    for opt, others in unsupported.items():
+      for other in others:
+        if given(opt) and given(other):
+          parser.error(f"{opt} can not be combined with {other}")
+    if args.max_seconds and args.seconds < 1:
+      parser.error("--max-seconds needs --seconds of at least 1")
+    if args.call_timeout is not None and not args.async_jobs:
+      parser.error("--call-timeout needs --async-jobs")
     DEBUG_PRINT=args.debug
+    RACE=args.race
+    USE_AST=args.ast
+    GKC_CMD=args.gkc
+    GKC_SECONDS=args.seconds
+    RELEVANCE=args.relevance
+    SIGNATURE_CHECK=args.signature
+    if args.portfolio:
+      PORTFOLIO, PORTFOLIO_STATS = load_portfolio(args.portfolio)
+      PORTFOLIO_WIDTH = args.portfolio_width
+      print("Portfolio:", ", ".join(st["name"] for st in PORTFOLIO))
+    MAX_SECONDS=args.max_seconds
+    if args.worker:
+      PROVER=WorkerProver(shlex.split(args.worker))
+    else:
+      PROVER=SubprocessProver([GKC_CMD], TEMP_DIR)
+    if args.async_jobs:
+      ASYNC_PROVER=AsyncSubprocessProver([GKC_CMD], TEMP_DIR, args.async_jobs, args.call_timeout)
+    if not args.no_cache:
+      PROOF_CACHE=ProofCache(args.cache_dir, CACHE_MAX_ENTRIES)
 
     if args.min:
       MIN_QUESTION_ID=int(args.min)
+    SHARD=args.shard
 
     id_list = []
     if args.ids:
       id_list = args.ids.split(",")
       id_list = [ int(x) for x in id_list ]
 
+    profiler = None
+    if args.profile is not None:
+      profiler = install_profiler()
+
     FOLIO_FILE = f"data/{datafiles[args.df]}"
     print("Process input:", FOLIO_FILE)
-
-    f=open(FOLIO_FILE,"r")
-    lines=f.readlines()
-    f.close()
-  
-    process_folio(lines, only_ids=id_list)
+    lines = None
+    if args.store:
+      lines = open_store(FOLIO_FILE)
+      if lines is not None: print("Using problem store:", lines.path)
+    if lines is None:
+      lines = read_folio(FOLIO_FILE)
+
+    results = None
+    done_ids = set()
+    if args.resume:
+      shard_suffix = f"_{SHARD[0]}of{SHARD[1]}" if SHARD else ""
+      results_file = args.results or f"results_{args.df}{shard_suffix}.jsonl"
+      done_ids = load_checkpoint(results_file)
+      print("Resuming from", results_file, "with", len(done_ids), "completed problems")
+      results = open(results_file, "a")
+    elif args.results:
+      results = open(args.results, "w")
+
+    if args.preflight:
+      preflight_folio(lines if isinstance(lines, ProblemStore) else read_folio(FOLIO_FILE), only_ids=id_list, skip_ids=done_ids)
+
+    if args.async_jobs:
+      asyncio.run(process_folio_async(lines, only_ids=id_list, jobs=args.async_jobs, results=results, skip_ids=done_ids))
+    elif args.stories:
+      process_stories(lines, only_ids=id_list, jobs=args.jobs, results=results, skip_ids=done_ids)
+    elif MAX_SECONDS:
+      deepen_folio(lines, only_ids=id_list, jobs=args.jobs, results=results, skip_ids=done_ids)
+    else:
+      process_folio(lines, only_ids=id_list, jobs=args.jobs, results=results, skip_ids=done_ids)
+
+    print("memo:", json.dumps(memo_summary()))
+    if RELEVANCE is not None:
+      print("relevance:", json.dumps(RELEVANCE_STATS))
+    if SIGNATURE_CHECK or args.preflight:
+      print("skipped:", json.dumps(skipped_summary()))
+    if PORTFOLIO:
+      save_portfolio_stats(args.portfolio)
+      print("portfolio:", json.dumps(PORTFOLIO_STATS))
+    if profiler is not None:
+      print("profile:", json.dumps(profiler.summary()))
+      if args.profile:
+        profiler.write(args.profile)
+
+    PROVER.close()
+    if results is not None:
+      results.close()
 
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+
+"""
+Merge the results of sharded ttconv.py runs into one report.
+
+Each input is a run log with ans: lines (runlog.txt) or a results JSONL file
+(--results / --resume). The results are combined, ordered by problem id and
+followed by accuracy totals.
+
+Usage:
+    ./ttmerge.py node*/results_t2_*of4.jsonl
+    ./ttmerge.py --expect 1001 --output merged_t2.jsonl node*/runlog.txt
+"""
+
+import sys
+import json
+import argparse
+
+LABELS = ["True", "False", "Uncertain"]
+
+
+def read_results(path):
+    """
+    Yield the result dicts of a run log or results file.
+
+    Lines starting with 'ans:' are read from run logs; in a JSONL file every
+    line is a result. Other lines and a partially written last line are skipped.
+    """
+    with open(path, "r") as f:
+        for line in f:
+            if line.startswith("ans:"):
+                line = line[4:]
+            elif not line.startswith("{"):
+                continue
+            try:
+                res = json.loads(line)
+            except ValueError:
+                continue
+            if "problem_id" in res:
+                yield res
+
+
+def merge_results(paths):
+    """
+    Combine the results of several files.
+
+    Returns:
+        list: The results ordered by problem id.
+        list: Problem ids found with different prover results in different files.
+    """
+    merged = {}
+    conflicts = []
+    for path in paths:
+        for res in read_results(path):
+            pid = res["problem_id"]
+            if pid in merged and merged[pid]["prover_res"] != res["prover_res"]:
+                conflicts.append(pid)
+            merged[pid] = res
+    return [merged[pid] for pid in sorted(merged)], sorted(set(conflicts))
+
+
+def accuracy_totals(results):
+    """
+    Returns:
+        dict: Number of problems, number and share of correct answers, the
+        counts per gold label and prover result, and the number of problems
+        answered without the prover (ttconv.py --signature).
+    """
+    correct = sum(1 for res in results if res["gold"] == res["prover_res"])
+    confusion = {}
+    for res in results:
+        row = confusion.setdefault(str(res["gold"]), { label: 0 for label in LABELS })
+        row[res["prover_res"]] = row.get(res["prover_res"], 0) + 1
+    return {
+        "total": len(results),
+        "correct": correct,
+        "accuracy": round(correct / len(results), 4) if results else 0,
+        "gold_vs_prover": confusion,
+        "skipped": sum(1 for res in results if "skipped" in res)
+    }
+
+
+def missing_ids(results, expect):
+    found = { res["problem_id"] for res in results }
+    return [pid for pid in range(expect) if pid not in found]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Merge sharded FOLIO results')
+    parser.add_argument("files", nargs="+", help="Run logs or results JSONL files of the shards")
+    parser.add_argument("--output", help="Also write the merged results to this JSONL file")
+    parser.add_argument("--expect", type=int, help="Number of problems in the split, to report missing problem ids")
+    args = parser.parse_args()
+
+    results, conflicts = merge_results(args.files)
+    for res in results:
+        print("ans:", json.dumps(res))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            for res in results:
+                f.write(json.dumps(res) + "\n")
+
+    for pid in conflicts:
+        print("conflict: problem", pid, "has different prover results in different files", file=sys.stderr)
+    totals = accuracy_totals(results)
+    if args.expect:
+        totals["missing"] = missing_ids(results, args.expect)
+    print("totals:", json.dumps(totals))
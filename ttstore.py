@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+"""
+Build the problem store of a FOLIO split for `ttconv.py --store`.
+
+The premises and conclusion of every problem are converted once and stored,
+with the positive and negative problem texts and the label, in
+data/<split>.gkps (see utils/problem_store.py). The store records a
+fingerprint of the conversion code; ttconv.py ignores it once that changes.
+"""
+
+import os
+import argparse
+from contextlib import redirect_stdout
+
+import ttconv
+from utils.problem_store import StoredProblem, write_store
+
+
+def stored_problems(lines):
+    """Convert FOLIO JSONL lines to StoredProblem tuples."""
+    with open(os.devnull, "w") as devnull:
+        for line in lines:
+            # The conversion prints the premises of every problem
+            with redirect_stdout(devnull):
+                label, premises, conclusion = ttconv.convert_logic(ttconv.parse_line(line))
+                posproblem, negproblem = ttconv.build_problems(premises, conclusion)
+            premises = [ p[0] if isinstance(p, list) else p for p in premises ]
+            yield StoredProblem(label, premises, conclusion, posproblem, negproblem)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the problem store of a FOLIO split')
+    parser.add_argument("df", choices=ttconv.datafiles, help="Choose a result set")
+    parser.add_argument("--ast", action="store_true", help="Build the problems from parsed formula trees, as ttconv.py --ast", default=False)
+    args = parser.parse_args()
+    ttconv.USE_AST = args.ast
+
+    folio_file = f"data/{ttconv.datafiles[args.df]}"
+    path = ttconv.store_path(folio_file)
+    count = write_store(path, stored_problems(ttconv.read_folio(folio_file)), folio_file, ast=args.ast,
+                        fingerprint=ttconv.conversion_fingerprint())
+    print("Wrote", count, "problems to", path)
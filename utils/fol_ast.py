@@ -0,0 +1,320 @@
+"""
+Abstract syntax tree for formulas in GK simple format.
+
+The formulas produced by fol_to_simple_logic are parsed once into a tree of
+small __slots__ nodes with interned symbol names. Emitters turn the tree back
+into GK simple format or into JSON-LD-LOGIC, and problems for the prover are
+built by combining trees instead of concatenating strings.
+
+The grammar follows the way GKC reads the simple format: all binary operators
+have the same precedence and associate to the left, so 'A => B & C' means
+'(A => B) & C'. A quantifier applies to the unary formula that follows it.
+"""
+
+import re
+import sys
+
+
+class ParseError(ValueError):
+    pass
+
+
+class Var:
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = sys.intern(name)
+
+
+class Fn:
+    """A constant (no args) or a function term."""
+    __slots__ = ("name", "args")
+
+    def __init__(self, name, args=()):
+        self.name = sys.intern(name)
+        self.args = args
+
+
+class Atom:
+    __slots__ = ("pred", "args")
+
+    def __init__(self, pred, args=()):
+        self.pred = sys.intern(pred)
+        self.args = args
+
+
+class Eq:
+    __slots__ = ("left", "right")
+
+    def __init__(self, left, right):
+        self.left = left
+        self.right = right
+
+
+class Not:
+    __slots__ = ("arg",)
+
+    def __init__(self, arg):
+        self.arg = arg
+
+
+class BinOp:
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+class Quant:
+    """A quantified formula, kind is '!' (forall) or '?' (exists)."""
+    __slots__ = ("kind", "vars", "body")
+
+    def __init__(self, kind, vars, body):
+        self.kind = kind
+        self.vars = vars
+        self.body = body
+
+
+BINARY_OPS = frozenset(["&", "|", "=>", "<=>", "<->", "<~>"])
+
+# Symbols are ASCII words that may contain inner '-' (e.g. l-2021), or plain
+# numbers. Like GKC, a word such as 2008SummerOlympics is rejected.
+TOKEN_RE = re.compile(r"\s*(?:(<=>|<->|<~>|=>|!=|[-&|()\[\],:.=!?])|([A-Za-z_]\w*(?:-\w+)*|\d+)(?!\w))", re.ASCII)
+
+
+def tokenize(text):
+    """
+    Split GK simple format text into tokens.
+
+    Returns:
+        list: (kind, value, position) tuples, kind is 'op' or 'id'.
+    """
+    tokens = []
+    pos = 0
+    end = len(text.rstrip())
+    while pos < end:
+        m = TOKEN_RE.match(text, pos)
+        if m is None:
+            raise ParseError(f"unexpected character {text[pos:].lstrip()[:1]!r} at {pos}")
+        if m.group(1):
+            tokens.append(("op", m.group(1), m.start(1)))
+        else:
+            tokens.append(("id", m.group(2), m.start(2)))
+        pos = m.end()
+    return tokens
+
+
+class Parser:
+
+    def __init__(self, text):
+        self.tokens = tokenize(text)
+        self.i = 0
+        self.bound = []
+
+    def peek(self):
+        if self.i < len(self.tokens):
+            return self.tokens[self.i]
+        return (None, None, -1)
+
+    def take(self, value=None):
+        kind, val, pos = self.peek()
+        if kind is None:
+            raise ParseError(f"unexpected end of formula, expected {value or 'more input'}")
+        if value is not None and val != value:
+            raise ParseError(f"expected {value!r} but found {val!r} at {pos}")
+        self.i += 1
+        return val
+
+    def formulas(self):
+        """Parse a list of sentences, each terminated by '.'. Empty sentences are skipped."""
+        res = []
+        while self.peek()[0] is not None:
+            # GKC accepts empty sentences, e.g. from a trailing newline
+            if self.peek()[1] == ".":
+                self.i += 1
+                continue
+            res.append(self.formula())
+            if self.peek()[0] is not None:
+                self.take(".")
+        return res
+
+    def formula(self):
+        left = self.unary()
+        while True:
+            kind, val, _ = self.peek()
+            if kind != "op" or val not in BINARY_OPS:
+                return left
+            self.i += 1
+            left = BinOp(val, left, self.unary())
+
+    def unary(self):
+        kind, val, pos = self.peek()
+        if val == "-":
+            self.i += 1
+            return Not(self.unary())
+        if val in ("!", "?") and kind == "op":
+            self.i += 1
+            self.take("[")
+            names = [self.take()]
+            while self.peek()[1] == ",":
+                self.i += 1
+                names.append(self.take())
+            self.take("]")
+            self.take(":")
+            self.bound.append(set(names))
+            try:
+                body = self.unary()
+            finally:
+                self.bound.pop()
+            return Quant(val, tuple(Var(n) for n in names), body)
+        if val == "(":
+            self.i += 1
+            res = self.formula()
+            self.take(")")
+            return res
+        if kind != "id":
+            raise ParseError(f"unexpected {val!r} at {pos}")
+        left = self.term()
+        nxt = self.peek()[1]
+        if nxt == "=":
+            self.i += 1
+            return Eq(left, self.term())
+        if nxt == "!=":
+            self.i += 1
+            return Not(Eq(left, self.term()))
+        if isinstance(left, Var):
+            raise ParseError(f"variable {left.name} used as a formula at {pos}")
+        return Atom(left.name, left.args)
+
+    def term(self):
+        kind, name, pos = self.peek()
+        if kind != "id":
+            raise ParseError(f"expected a term but found {name!r} at {pos}")
+        self.i += 1
+        if self.peek()[1] == "(":
+            self.i += 1
+            args = [self.term()]
+            while self.peek()[1] == ",":
+                self.i += 1
+                args.append(self.term())
+            self.take(")")
+            return Fn(name, tuple(args))
+        if any(name in scope for scope in self.bound):
+            return Var(name)
+        return Fn(name)
+
+
+def parse_formula(text):
+    """
+    Parse a single formula in GK simple format. A trailing '.' is allowed.
+
+    Raises:
+        ParseError: If the text is not a well formed formula.
+    """
+    p = Parser(text)
+    res = p.formula()
+    if p.peek()[1] == ".":
+        p.i += 1
+    if p.peek()[0] is not None:
+        kind, val, pos = p.peek()
+        raise ParseError(f"unexpected {val!r} at {pos}")
+    return res
+
+
+def parse_formulas(text):
+    """Parse '.' terminated sentences in GK simple format into a list of formulas."""
+    return Parser(text).formulas()
+
+
+# ---------- emitters ----------
+
+def term_to_gk(t):
+    if t.__class__ is Var or not t.args:
+        return t.name
+    return f"{t.name}({', '.join(term_to_gk(a) for a in t.args)})"
+
+
+def to_gk(f):
+    """Emit a formula in GK simple format, parenthesizing every compound subformula."""
+    cls = f.__class__
+    if cls is Atom:
+        if not f.args:
+            return f.pred
+        return f"{f.pred}({', '.join(term_to_gk(a) for a in f.args)})"
+    if cls is Eq:
+        return f"{term_to_gk(f.left)}={term_to_gk(f.right)}"
+    if cls is Not:
+        return "-" + _gk_operand(f.arg)
+    if cls is BinOp:
+        return f"{_gk_operand(f.left)} {f.op} {_gk_operand(f.right)}"
+    if cls is Quant:
+        return f"{f.kind} [{', '.join(v.name for v in f.vars)}] : {_gk_operand(f.body)}"
+    raise TypeError(f"not a formula: {f!r}")
+
+
+def _gk_operand(f):
+    if f.__class__ in (Atom, Not):
+        return to_gk(f)
+    return f"({to_gk(f)})"
+
+
+def symbol_to_json(name):
+    # Symbols starting with an uppercase letter would be read as variables
+    if name[:1].isupper():
+        return "?:" + name
+    return name
+
+
+def term_to_json(t):
+    if t.__class__ is Var:
+        return t.name
+    if not t.args:
+        if t.name.isdigit():
+            return int(t.name)
+        return symbol_to_json(t.name)
+    return [symbol_to_json(t.name)] + [term_to_json(a) for a in t.args]
+
+
+def to_json_ld(f):
+    """Emit a formula as a JSON-LD-LOGIC structure of nested lists, in the layout GKC -convert -json uses."""
+    cls = f.__class__
+    if cls is Atom:
+        if not f.args:
+            return symbol_to_json(f.pred)
+        return [symbol_to_json(f.pred)] + [term_to_json(a) for a in f.args]
+    if cls is Eq:
+        return [term_to_json(f.left), "=", term_to_json(f.right)]
+    if cls is Not:
+        return ["~", to_json_ld(f.arg)]
+    if cls is BinOp:
+        if f.op == "<~>":
+            return ["~", [to_json_ld(f.left), "<=>", to_json_ld(f.right)]]
+        op = "<=>" if f.op == "<->" else f.op
+        return [to_json_ld(f.left), op, to_json_ld(f.right)]
+    if cls is Quant:
+        # One quantifier per variable, as GKC does
+        res = to_json_ld(f.body)
+        kind = "forall" if f.kind == "!" else "exists"
+        for v in reversed(f.vars):
+            res = [kind, [v.name], res]
+        return res
+    raise TypeError(f"not a formula: {f!r}")
+
+
+# ---------- problems ----------
+
+def positive_problem(premises, conclusion):
+    """Formulas whose contradiction proves the conclusion: the premises and the negated conclusion."""
+    return list(premises) + [Not(conclusion)]
+
+
+def negative_problem(premises, conclusion):
+    """Formulas whose contradiction disproves the conclusion: the premises and the conclusion."""
+    return list(premises) + [conclusion]
+
+
+def problem_to_gk(formulas):
+    """Render a list of formulas as a GK simple format problem, one sentence per line."""
+    return "".join(to_gk(f) + ".\n" for f in formulas)
@@ -0,0 +1,45 @@
+"""
+Syntax checks of problems in GK simple format, run before the prover.
+
+GKC reports a malformed problem only after it was started on it. These checks
+find the same problems in-process: FOL symbols that the conversion left in the
+text, unbalanced parentheses and anything else utils/fol_ast.py does not parse.
+"""
+
+import re
+
+from utils.fol_ast import parse_formulas, ParseError
+
+NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+
+
+def paren_errors(text):
+    """Report the first ')' without a '(' and the number of unclosed '('."""
+    depth = 0
+    for pos, c in enumerate(text):
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth < 0:
+                return [f"')' without '(' at {pos}"]
+    return [f"{depth} unclosed '('"] if depth else []
+
+
+def problem_errors(problemstr):
+    """
+    Check a problem in GK simple format.
+
+    Returns:
+        list: Descriptions of the errors found, empty if the problem is fine.
+    """
+    errors = []
+    symbols = sorted(set(NON_ASCII_RE.findall(problemstr)))
+    if symbols:
+        errors.append("unconverted symbols " + " ".join(symbols))
+    errors.extend(paren_errors(problemstr))
+    try:
+        parse_formulas(problemstr)
+    except ParseError as e:
+        errors.append(f"parse error: {e}")
+    return errors
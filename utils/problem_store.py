@@ -0,0 +1,143 @@
+"""
+Compact binary store of preprocessed FOLIO problems.
+
+Layout of a store file:
+
+    header   MAGIC, version, flags, problem count, size and mtime of the
+             source JSONL file, offset of the index, fingerprint of the
+             conversion code
+    records  one zlib compressed record per problem, in problem id order
+    index    count + 1 little endian uint64 offsets, record i spans
+             offsets[i]:offsets[i+1]
+
+A record holds length prefixed UTF-8 strings: the label, the conclusion, the
+positive and negative problem texts and the premises. The file is memory
+mapped, so opening it costs only the header read and any problem can be read
+directly by id.
+"""
+
+import mmap
+import os
+import struct
+import zlib
+from collections import namedtuple
+
+MAGIC = b"GKPS"
+VERSION = 2
+FLAG_AST = 1
+HEADER = struct.Struct("<4sHHIQQQQ")
+OFFSET = struct.Struct("<Q")
+LENGTH = struct.Struct("<I")
+
+StoredProblem = namedtuple("StoredProblem", ["label", "premises", "conclusion", "posproblem", "negproblem"])
+
+
+class StoreError(Exception):
+    pass
+
+
+def source_stamp(path):
+    """Size and modification time of the source file, used to detect a changed source."""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def encode_problem(problem):
+    label = problem.label if problem.label is not None else ""
+    strings = [label, problem.conclusion, problem.posproblem, problem.negproblem] + list(problem.premises)
+    parts = [LENGTH.pack(len(strings))]
+    for s in strings:
+        b = s.encode()
+        parts.append(LENGTH.pack(len(b)))
+        parts.append(b)
+    return zlib.compress(b"".join(parts))
+
+
+def decode_problem(data):
+    data = zlib.decompress(data)
+    (n,) = LENGTH.unpack_from(data, 0)
+    pos = LENGTH.size
+    strings = []
+    for _ in range(n):
+        (length,) = LENGTH.unpack_from(data, pos)
+        pos += LENGTH.size
+        strings.append(data[pos:pos + length].decode())
+        pos += length
+    label, conclusion, posproblem, negproblem = strings[:4]
+    return StoredProblem(label or None, strings[4:], conclusion, posproblem, negproblem)
+
+
+def write_store(path, problems, source, ast=False, fingerprint=0):
+    """
+    Write a store file.
+
+    Args:
+        path (str): The store file to write.
+        problems (iterable): StoredProblem tuples in problem id order.
+        source (str): The JSONL file the problems were converted from.
+        ast (bool): Whether the problem texts were built with --ast.
+        fingerprint (int): 64 bit fingerprint of the conversion code, see
+            ttconv.conversion_fingerprint.
+
+    Returns:
+        int: The number of problems written.
+    """
+    size, mtime = source_stamp(source)
+    tmp = path + ".tmp"
+    offsets = []
+    with open(tmp, "wb") as f:
+        f.write(b"\0" * HEADER.size)
+        for problem in problems:
+            offsets.append(f.tell())
+            f.write(encode_problem(problem))
+        offsets.append(f.tell())
+        index_offset = f.tell()
+        f.write(b"".join(OFFSET.pack(o) for o in offsets))
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, FLAG_AST if ast else 0, len(offsets) - 1, size, mtime, index_offset, fingerprint))
+    os.replace(tmp, path)
+    return len(offsets) - 1
+
+
+class ProblemStore:
+    """
+    Read-only, memory mapped view of a store file.
+
+    Supports len(), random access by problem id and iteration in id order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mm) < HEADER.size:
+            raise StoreError(f"{path} is not a problem store")
+        magic, version, flags, self.count, self.source_size, self.source_mtime, self.index_offset, self.fingerprint = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise StoreError(f"{path} is not a problem store")
+        if version != VERSION:
+            raise StoreError(f"{path} has version {version}, expected {VERSION}")
+        self.ast = bool(flags & FLAG_AST)
+
+    def is_fresh(self, source):
+        """Whether the store was built from the current version of source."""
+        try:
+            return source_stamp(source) == (self.source_size, self.source_mtime)
+        except OSError:
+            return False
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, problem_id):
+        if not 0 <= problem_id < self.count:
+            raise IndexError(problem_id)
+        start, end = struct.unpack_from("<QQ", self.mm, self.index_offset + OFFSET.size * problem_id)
+        return decode_problem(self.mm[start:end])
+
+    def __iter__(self):
+        for problem_id in range(self.count):
+            yield self[problem_id]
+
+    def close(self):
+        self.mm.close()
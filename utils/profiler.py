@@ -0,0 +1,109 @@
+import asyncio
+import bisect
+import functools
+import json
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = [0.00001, 0.0001, 0.001, 0.01, 0.1, 1, 10]
+
+
+class Stage:
+    """Call count, total time and latency histogram of one pipeline stage."""
+    __slots__ = ("count", "total", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def summary(self):
+        labels = [f"<={b:g}s" for b in BUCKETS] + [f">{BUCKETS[-1]:g}s"]
+        return {
+            "count": self.count,
+            "total": round(self.total, 9),
+            "mean": round(self.total / self.count, 9) if self.count else 0,
+            "max": round(self.max, 9),
+            "histogram": { label: n for label, n in zip(labels, self.histogram) if n }
+        }
+
+
+class Profiler:
+    """
+    Collects the time spent in named stages of a run.
+
+    Stages are timed by wrapping the functions that implement them with
+    instrument(), so nothing is measured, and nothing costs extra, unless a
+    profiler is installed. Nested stages are each counted in full, e.g. the
+    time of 'symbols' is also part of 'convert'. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.info = {}
+
+    def record(self, name, elapsed):
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = Stage()
+            stage.count += 1
+            stage.total += elapsed
+            stage.max = max(stage.max, elapsed)
+            stage.histogram[bisect.bisect_left(BUCKETS, elapsed)] += 1
+
+    def timed(self, name, func):
+        """Return func wrapped so that every call is recorded as stage name. Coroutine functions are timed until they return."""
+        perf_counter = time.perf_counter
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                t0 = perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(name, perf_counter() - t0)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(name, perf_counter() - t0)
+        return wrapper
+
+    def instrument(self, obj, attr, name):
+        """
+        Replace obj.attr (a function of a module, class or instance) with a timed version.
+
+        Args:
+            obj: The module, class or instance holding the function.
+            attr (str): Name of the function.
+            name (str): Stage name the calls are recorded under.
+        """
+        setattr(obj, attr, self.timed(name, getattr(obj, attr)))
+
+    def summary(self):
+        """
+        Returns:
+            dict: Wall time, extra info and per-stage statistics of the run so far.
+        """
+        with self.lock:
+            stages = { name: stage.summary() for name, stage in self.stages.items() }
+        return {
+            "wall": round(time.perf_counter() - self.start, 6),
+            **self.info,
+            "stages": stages
+        }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+            f.write("\n")
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+
+class ProofCache:
+    """
+    On-disk, content-addressed cache of prover outcomes.
+
+    Entries are keyed by a hash of the prover binary, its command line flags and
+    the problem text, so a changed problem or a different GKC build is always
+    proved again. Each entry is a small JSON file; the least recently used
+    entries are evicted once the cache holds more than max_entries files.
+    """
+
+    def __init__(self, path, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.binary_ids = {}
+        os.makedirs(path, exist_ok=True)
+        self.count = sum(len(files) for _, _, files in os.walk(path))
+
+    def binary_id(self, cmd):
+        """
+        Identify a prover binary by its resolved path, size and modification time.
+
+        Args:
+            cmd (str): The prover command as given on the command line.
+
+        Returns:
+            str: A string that changes whenever the binary is replaced.
+        """
+        if cmd not in self.binary_ids:
+            path = shutil.which(cmd) or cmd
+            try:
+                st = os.stat(path)
+                self.binary_ids[cmd] = f"{os.path.realpath(path)}:{st.st_size}:{st.st_mtime_ns}"
+            except OSError:
+                self.binary_ids[cmd] = path
+        return self.binary_ids[cmd]
+
+    def key(self, problemstr, command):
+        """
+        Compute the cache key of a prover call.
+
+        Args:
+            problemstr (str): The problem text passed to the prover.
+            command (list): The prover command line without the input file.
+
+        Returns:
+            str: Hex digest identifying the call.
+        """
+        h = hashlib.sha256()
+        h.update(self.binary_id(command[0]).encode())
+        h.update(b"\0")
+        h.update(" ".join(command[1:]).encode())
+        h.update(b"\0")
+        h.update(problemstr.encode())
+        return h.hexdigest()
+
+    def _file(self, key):
+        return os.path.join(self.path, key[:2], key[2:] + ".json")
+
+    def get(self, key):
+        """
+        Look up a cached outcome.
+
+        Returns:
+            tuple: (True, result) on a hit, (False, None) on a miss.
+        """
+        fn = self._file(key)
+        try:
+            with open(fn) as f:
+                result = json.load(f)["result"]
+        except (OSError, ValueError, KeyError):
+            return False, None
+        try:
+            os.utime(fn)
+        except OSError:
+            pass
+        return True, result
+
+    def put(self, key, result):
+        fn = self._file(key)
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        tmp = f"{fn}.{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, "w") as f:
+            json.dump({"result": result}, f)
+        existed = os.path.exists(fn)
+        os.replace(tmp, fn)
+        with self.lock:
+            if not existed:
+                self.count += 1
+            if self.count > self.max_entries:
+                self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is at 90% of its size limit."""
+        entries = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                fn = os.path.join(root, name)
+                try:
+                    entries.append((os.stat(fn).st_mtime, fn))
+                except OSError:
+                    pass
+        entries.sort()
+        excess = len(entries) - int(self.max_entries * 0.9)
+        for _, fn in entries[:max(excess, 0)]:
+            try:
+                os.remove(fn)
+            except OSError:
+                pass
+        self.count = len(entries) - max(excess, 0)
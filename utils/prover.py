@@ -0,0 +1,318 @@
+import asyncio
+import os
+import queue
+import signal
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+# Worker protocol: a request is a header line with the prover flags, the
+# problem text and an end line; the worker answers with the prover output
+# followed by an end line.
+REQUEST_HEADER = "%%PROBLEM"
+END_MARKER = "%%END"
+
+
+def write_problem(problemstr, temp_dir=None):
+    """Write a problem to a new, uniquely named temporary file in temp_dir and return its path."""
+    fd, path = tempfile.mkstemp(prefix="gkc_", suffix=".txt", dir=temp_dir)
+    with os.fdopen(fd, "w") as f:
+        f.write(problemstr)
+    return path
+
+
+@contextmanager
+def temp_problem_file(problemstr, temp_dir=None):
+    """
+    Context manager writing a problem to a temporary file for the prover.
+
+    Use a memory-backed temp_dir such as /dev/shm when available. The file is
+    removed on exit, so concurrent runs never share an input file.
+
+    Yields:
+        str: Path of the temporary file.
+    """
+    path = write_problem(problemstr, temp_dir)
+    try:
+        yield path
+    finally:
+        os.remove(path)
+
+
+class SubprocessProver:
+    """
+    Prover backend starting a fresh prover process for every problem.
+
+    The problem is written to a temporary file in temp_dir, which is passed to
+    the prover as its first argument, followed by the flags.
+    """
+
+    def __init__(self, command, temp_dir=None):
+        self.command = list(command)
+        self.temp_dir = temp_dir
+
+    def prove(self, problemstr, flags):
+        """
+        Run the prover on a single problem.
+
+        Args:
+            problemstr (str): The problem text.
+            flags (list): Prover command line flags.
+
+        Returns:
+            str: The prover output.
+        """
+        with temp_problem_file(problemstr, self.temp_dir) as path:
+            return self.run(path, flags)
+
+    def run(self, path, flags):
+        """Run the prover on a problem file and return its output."""
+        return subprocess.run(self.command + [path] + list(flags), capture_output=True, text=True).stdout
+
+    def prove_many(self, problems, flags):
+        """Run the prover on a list of problems and return the outputs in the same order."""
+        return [self.prove(p, flags) for p in problems]
+
+    def race(self, jobs, stop):
+        """
+        Run the prover on several jobs at the same time, the first one to win stops the others.
+
+        Args:
+            jobs (list): (problem text, flags) pairs. Jobs with the same
+                problem text share one temporary file.
+            stop (callable): Called as stop(index, output) for every job that
+                finishes, in the order they finish. Once it returns True the
+                provers still running are killed.
+
+        Returns:
+            int: Index of the job for which stop returned True, None if there was none.
+        """
+        paths = {}
+        procs = []
+        try:
+            for problemstr, flags in jobs:
+                if problemstr not in paths:
+                    paths[problemstr] = write_problem(problemstr, self.temp_dir)
+                procs.append(subprocess.Popen(self.command + [paths[problemstr]] + list(flags),
+                                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True))
+            with ThreadPoolExecutor(max_workers=len(procs)) as pool:
+                futures = { pool.submit(proc.communicate): i for i, proc in enumerate(procs) }
+                try:
+                    for fut in as_completed(futures):
+                        if stop(futures[fut], fut.result()[0]):
+                            return futures[fut]
+                    return None
+                finally:
+                    # Before leaving the pool, which waits for the provers
+                    for proc in procs:
+                        if proc.poll() is None:
+                            proc.kill()
+        finally:
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+            for path in paths.values():
+                os.remove(path)
+
+    def close(self):
+        pass
+
+
+class AsyncSubprocessProver(SubprocessProver):
+    """
+    asyncio version of SubprocessProver.
+
+    At most concurrency prover processes run at the same time. A call that
+    takes longer than timeout seconds, or whose task is cancelled, kills its
+    prover process.
+    """
+
+    def __init__(self, command, temp_dir=None, concurrency=16, timeout=None):
+        super().__init__(command, temp_dir)
+        self.timeout = timeout
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def prove(self, problemstr, flags):
+        """
+        Run the prover on a single problem.
+
+        Raises:
+            asyncio.TimeoutError: If the prover did not finish within the timeout.
+        """
+        async with self.semaphore:
+            with temp_problem_file(problemstr, self.temp_dir) as path:
+                spawn = asyncio.ensure_future(asyncio.create_subprocess_exec(*self.command, path, *flags,
+                                                                             stdout=asyncio.subprocess.PIPE,
+                                                                             stderr=asyncio.subprocess.PIPE))
+                try:
+                    proc = await asyncio.shield(spawn)
+                except asyncio.CancelledError:
+                    # Cancelled while starting: wait for the process, so it can be killed below
+                    proc = await spawn
+                    self.kill(proc)
+                    await proc.wait()
+                    raise
+                try:
+                    stdout, _ = await asyncio.wait_for(proc.communicate(), self.timeout)
+                finally:
+                    if proc.returncode is None:
+                        self.kill(proc)
+                        await proc.wait()
+        return stdout.decode()
+
+    @staticmethod
+    def kill(proc):
+        # proc.kill() polls the process first, which can reap it behind the
+        # back of the asyncio child watcher and make it warn
+        try:
+            os.kill(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    async def prove_many(self, problems, flags):
+        return await asyncio.gather(*(self.prove(p, flags) for p in problems))
+
+
+class Worker:
+    """A single long-lived worker process speaking the request protocol over stdin/stdout."""
+
+    def __init__(self, command):
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     text=True, bufsize=1)
+
+    def send(self, problemstr, flags):
+        self.proc.stdin.write(f"{REQUEST_HEADER} {' '.join(flags)}\n")
+        self.proc.stdin.write(problemstr)
+        if not problemstr.endswith("\n"):
+            self.proc.stdin.write("\n")
+        self.proc.stdin.write(END_MARKER + "\n")
+
+    def receive(self):
+        lines = []
+        for line in self.proc.stdout:
+            if line.rstrip("\n") == END_MARKER:
+                return "".join(lines)
+            lines.append(line)
+        raise RuntimeError(f"prover worker exited with code {self.proc.wait()}")
+
+    def kill(self):
+        """Kill the worker, close its pipes and wait for it to exit."""
+        self.proc.kill()
+        for pipe in (self.proc.stdin, self.proc.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+        self.proc.wait()
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait()
+
+
+class WorkerProver:
+    """
+    Prover backend keeping long-lived worker processes.
+
+    Problems are sent to the worker over a pipe, so there is no process
+    startup or temporary file per problem. Each concurrent caller gets its own
+    worker; idle workers are reused, so the number of workers grows to the
+    number of problems proved at the same time.
+    """
+
+    def __init__(self, command):
+        self.command = list(command)
+        self.idle = queue.LifoQueue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            worker = Worker(self.command)
+            with self.lock:
+                self.workers.append(worker)
+            return worker
+
+    def release(self, worker):
+        if worker.proc.poll() is None:
+            self.idle.put(worker)
+        else:
+            self.discard(worker)
+
+    def discard(self, worker):
+        """Kill a worker that can not be reused and forget it."""
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+        worker.kill()
+
+    def prove(self, problemstr, flags):
+        return self.prove_many([problemstr], flags)[0]
+
+    def prove_many(self, problems, flags):
+        """Submit all problems to one worker and read the outputs back, in the same order."""
+        worker = self.acquire()
+        # Writing from a separate thread keeps a large batch from blocking on
+        # a full pipe while the worker waits for its output to be read.
+        writer = threading.Thread(target=lambda: [worker.send(p, flags) for p in problems])
+        writer.start()
+        try:
+            outputs = [worker.receive() for _ in problems]
+        except Exception:
+            worker.proc.kill()
+            writer.join()
+            self.discard(worker)
+            raise
+        writer.join()
+        self.release(worker)
+        return outputs
+
+    def race(self, jobs, stop):
+        """
+        Worker version of SubprocessProver.race.
+
+        Every job goes to its own worker. The workers still busy when stop
+        returns True are killed, as their answer can not be cancelled.
+        """
+        workers = [self.acquire() for _ in jobs]
+        finished = set()
+        try:
+            with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+                def run(i):
+                    workers[i].send(*jobs[i])
+                    return workers[i].receive()
+                futures = { pool.submit(run, i): i for i in range(len(jobs)) }
+                try:
+                    for fut in as_completed(futures):
+                        i = futures[fut]
+                        output = fut.result()
+                        finished.add(i)
+                        if stop(i, output):
+                            return i
+                    return None
+                finally:
+                    # Killing the busy workers ends the threads waiting on them,
+                    # their pipes are closed once the pool has joined the threads.
+                    for i, worker in enumerate(workers):
+                        if i not in finished:
+                            worker.proc.kill()
+        finally:
+            for i, worker in enumerate(workers):
+                if i in finished:
+                    self.release(worker)
+                else:
+                    self.discard(worker)
+
+    def close(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.close()
+            self.workers = []
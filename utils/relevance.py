@@ -0,0 +1,88 @@
+"""
+Symbol based premise selection in the style of SInE (Hoder and Voronkov, 2011).
+
+A premise is triggered by one of its symbols if that symbol is among the
+rarest symbols of the premise, counting in how many premises each symbol
+occurs. Starting from the symbols of the goal, every triggered premise is
+selected and its symbols trigger further premises, until nothing changes.
+Premises that can not be reached this way are left out of the problem.
+"""
+
+from utils.fol_ast import Var, Atom, Eq, Not, BinOp, Quant
+
+
+def term_symbols(t, res):
+    if t.__class__ is Var:
+        return
+    res.add(t.name)
+    for a in t.args:
+        term_symbols(a, res)
+
+
+def formula_symbols(f, res=None):
+    """
+    Collect the predicate, function and constant names of a formula.
+
+    Returns:
+        set: The symbol names, variables are not included.
+    """
+    if res is None:
+        res = set()
+    cls = f.__class__
+    if cls is Atom:
+        res.add(f.pred)
+        for a in f.args:
+            term_symbols(a, res)
+    elif cls is Eq:
+        term_symbols(f.left, res)
+        term_symbols(f.right, res)
+    elif cls is Not or cls is Quant:
+        formula_symbols(f.arg if cls is Not else f.body, res)
+    elif cls is BinOp:
+        formula_symbols(f.left, res)
+        formula_symbols(f.right, res)
+    return res
+
+
+def select_premises(premises, goal, tolerance=1.0):
+    """
+    Select the premises relevant to a goal.
+
+    Args:
+        premises (list): Premise formulas.
+        goal: The goal formula, e.g. the negated conclusion.
+        tolerance (float): A symbol triggers a premise if it occurs in at most
+            tolerance times as many premises as the rarest symbol of that
+            premise. Larger values select more premises.
+
+    Returns:
+        list: Indices of the selected premises, in their original order.
+    """
+    symbols = [formula_symbols(p) for p in premises]
+    occurrences = {}
+    for syms in symbols:
+        for s in syms:
+            occurrences[s] = occurrences.get(s, 0) + 1
+
+    triggers = {}
+    for idx, syms in enumerate(symbols):
+        if not syms:
+            continue
+        limit = tolerance * min(occurrences[s] for s in syms)
+        for s in syms:
+            if occurrences[s] <= limit:
+                triggers.setdefault(s, []).append(idx)
+
+    selected = set()
+    seen = set()
+    frontier = list(formula_symbols(goal))
+    while frontier:
+        s = frontier.pop()
+        if s in seen:
+            continue
+        seen.add(s)
+        for idx in triggers.get(s, ()):
+            if idx not in selected:
+                selected.add(idx)
+                frontier.extend(symbols[idx] - seen)
+    return sorted(selected)
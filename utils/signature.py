@@ -0,0 +1,153 @@
+"""
+Symbol signatures of formulas: predicate and function arities, constants and variables.
+
+Used to answer problems without the prover, see ttconv.signature_reason.
+
+A predicate of the conclusion that no premise has is free: every model of
+the premises can be changed on it and stays a model. If the free predicates
+can make the conclusion true and can make it false, neither the conclusion
+nor its negation follows from the premises, unless they are inconsistent.
+free_control tells whether that is the case, conservatively.
+"""
+
+from utils.fol_ast import Var, Atom, Eq, Not, BinOp, Quant
+
+
+class Signature:
+    """Symbols of a set of formulas, with the arities each name is used with."""
+
+    def __init__(self):
+        self.predicates = {}
+        self.functions = {}
+        self.constants = set()
+        self.variables = set()
+
+    def add_term(self, t):
+        if t.__class__ is Var:
+            self.variables.add(t.name)
+        elif not t.args:
+            self.constants.add(t.name)
+        else:
+            self.functions.setdefault(t.name, set()).add(len(t.args))
+            for a in t.args:
+                self.add_term(a)
+
+    def add_formula(self, f):
+        cls = f.__class__
+        if cls is Atom:
+            self.predicates.setdefault(f.pred, set()).add(len(f.args))
+            for a in f.args:
+                self.add_term(a)
+        elif cls is Eq:
+            self.add_term(f.left)
+            self.add_term(f.right)
+        elif cls is Not:
+            self.add_formula(f.arg)
+        elif cls is BinOp:
+            self.add_formula(f.left)
+            self.add_formula(f.right)
+        elif cls is Quant:
+            self.variables.update(v.name for v in f.vars)
+            self.add_formula(f.body)
+
+    def arities(self):
+        """
+        Returns:
+            dict: The arities each symbol name is used with, constants have arity 0.
+        """
+        res = {}
+        for table in (self.predicates, self.functions):
+            for name, arities in table.items():
+                res.setdefault(name, set()).update(arities)
+        for name in self.constants:
+            res.setdefault(name, set()).add(0)
+        return res
+
+    def arity_mismatches(self, other=None):
+        """
+        Names used with more than one arity, here or in other.
+
+        Returns:
+            list: 'name/arity' strings of every use of the mismatched names.
+        """
+        arities = self.arities()
+        if other is not None:
+            for name, a in other.arities().items():
+                arities.setdefault(name, set()).update(a)
+        return [ f"{name}/{a}" for name in sorted(arities) if len(arities[name]) > 1 for a in sorted(arities[name]) ]
+
+
+def signature(formulas):
+    """Build the Signature of a list of formulas."""
+    sig = Signature()
+    for f in formulas:
+        sig.add_formula(f)
+    return sig
+
+
+def free_atoms(f, free, res=None):
+    """Collect the atoms of f with a predicate in free."""
+    if res is None:
+        res = []
+    cls = f.__class__
+    if cls is Atom:
+        if f.pred in free:
+            res.append(f)
+    elif cls is Not:
+        free_atoms(f.arg, free, res)
+    elif cls is BinOp:
+        free_atoms(f.left, free, res)
+        free_atoms(f.right, free, res)
+    elif cls is Quant:
+        free_atoms(f.body, free, res)
+    return res
+
+
+def independent(a, b, free):
+    """Whether a and b share no free predicate, so they can be set independently."""
+    return not ({ at.pred for at in free_atoms(a, free) } & { at.pred for at in free_atoms(b, free) })
+
+
+def free_control(f, free):
+    """
+    Whether the predicates in free can make f true and can make f false.
+
+    The answer is conservative: (False, False) means nothing is known. A free
+    atom is set to either value. Under a quantifier, f is set for all values
+    of the variables at once only if every free atom has all the quantified
+    variables as arguments, so the instances are different atoms.
+
+    Args:
+        f: A formula from utils.fol_ast.
+        free (set): Predicate names that no premise has.
+
+    Returns:
+        tuple: (can be made true, can be made false)
+    """
+    cls = f.__class__
+    if cls is Atom:
+        return (True, True) if f.pred in free else (False, False)
+    if cls is Not:
+        t, fa = free_control(f.arg, free)
+        return fa, t
+    if cls is Quant:
+        t, fa = free_control(f.body, free)
+        names = { v.name for v in f.vars }
+        separate = all(names <= { a.name for a in at.args if a.__class__ is Var } for at in free_atoms(f.body, free))
+        if f.kind == "!":
+            return t and separate, fa
+        return t, fa and separate
+    if cls is BinOp:
+        lt, lf = free_control(f.left, free)
+        rt, rf = free_control(f.right, free)
+        both = independent(f.left, f.right, free)
+        if f.op == "&":
+            return lt and rt and both, lf or rf
+        if f.op == "|":
+            return lt or rt, lf and rf and both
+        if f.op == "=>":
+            return lf or rt, lt and rf and both
+        # <=>, <-> and <~>: one side decides if the other side can not change with it
+        decides = (lt and lf or rt and rf) and both
+        return decides, decides
+    return False, False